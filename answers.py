@@ -0,0 +1,315 @@
+import asyncio
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+
+from cache import PredictionCache
+
+# Cached marker for intents that have no answer, so misses aren't re-queried
+_NO_ANSWER = object()
+
+# IN (...) lists are padded to these sizes so only a handful of distinct
+# statements are ever prepared, whatever the batch size
+_IN_BUCKETS = (1, 4, 16, 64, 256)
+
+
+class ConnectionPool:
+    def __init__(self, connect, size=4, timeout=10.0):
+        """
+        Fixed-size pool of DB-API connections
+
+        Args:
+            connect (callable): Returns a new DB-API connection
+            size (int): Maximum number of open connections
+            timeout (float): Seconds to wait for a free connection
+        """
+        self._connect = connect
+        self.size = size
+        self.timeout = timeout
+        self._idle = []
+        self._opened = 0
+        # Signalled whenever a connection is returned or a slot is freed
+        self._available = threading.Condition()
+
+    @contextmanager
+    def connection(self):
+        """
+        Borrow a connection for the duration of a with-block
+
+        Yields:
+            Connection: Open DB-API connection
+        """
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            # Don't return a connection in an unknown state to the pool
+            self._discard(conn)
+            raise
+        else:
+            with self._available:
+                self._idle.append(conn)
+                self._available.notify()
+
+    def _acquire(self):
+        deadline = time.monotonic() + self.timeout
+        with self._available:
+            while True:
+                if self._idle:
+                    return self._idle.pop()
+                if self._opened < self.size:
+                    self._opened += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise TimeoutError(f"No database connection free after {self.timeout}s")
+                self._available.wait(remaining)
+        # Connect outside the lock; the slot is already reserved
+        try:
+            return self._connect()
+        except Exception:
+            self._release_slot()
+            raise
+
+    def _release_slot(self):
+        with self._available:
+            self._opened -= 1
+            self._available.notify()
+
+    def _discard(self, conn):
+        self._release_slot()
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def close(self):
+        """Close every idle connection"""
+        with self._available:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._discard(conn)
+
+
+class AnswerStore:
+    def __init__(self, pool, placeholder='?', cursor_options=None, table='intent_answers',
+                 cache_size=1024, cache_ttl=300.0, max_workers=4, metrics=None):
+        """
+        Look up answers for predicted intent labels
+
+        Answers live in a two-column table (intent, answer). Lookups go
+        through an in-memory read-through cache, and batches of intents are
+        fetched with one parameterized IN query per connection round-trip.
+
+        Args:
+            pool (ConnectionPool): Pool the store borrows connections from
+            placeholder (str): Parameter marker of the driver ('?' or '%s')
+            cursor_options (dict): Keyword arguments for conn.cursor(),
+                e.g. {'prepared': True} for mysql.connector
+            table (str): Table holding the answers
+            cache_size (int): Maximum number of cached intents
+            cache_ttl (float): Seconds a cached answer stays valid
+            max_workers (int): Threads used by the async methods
+            metrics (Metrics): Optional recorder for query timings and cache hit rates
+        """
+        self.pool = pool
+        self.placeholder = placeholder
+        self.cursor_options = cursor_options or {}
+        self.table = table
+        # Labels are looked up exactly; 'fee_structure' and 'Fee Structure' differ
+        self.cache = PredictionCache(max_size=cache_size, ttl=cache_ttl, key=lambda intent: intent)
+        # Bumped by set_answers(); lookups that started before a write don't cache what they read
+        self._generation = 0
+        self._cache_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.metrics = metrics
+        if metrics is not None:
+            metrics.track_cache('answer_cache', self.cache)
+
+    @classmethod
+    def for_sqlite(cls, path, pool_size=4, **options):
+        """
+        Create a store backed by SQLite
+
+        Args:
+            path (str): Database file, or a URI such as
+                'file:answers?mode=memory&cache=shared' for a shared in-memory DB
+            pool_size (int): Maximum number of open connections
+            **options: Passed through to AnswerStore
+
+        Returns:
+            AnswerStore: Store using '?' placeholders
+        """
+        def connect():
+            # Pooled connections move between threads, but only one uses each at a time
+            return sqlite3.connect(path, uri=True, check_same_thread=False)
+
+        return cls(ConnectionPool(connect, size=pool_size), placeholder='?', **options)
+
+    @classmethod
+    def for_mysql(cls, pool_size=4, connect_args=None, **options):
+        """
+        Create a store backed by MySQL using prepared statements
+
+        Connection settings default to the CHATBOT_DB_HOST, CHATBOT_DB_USER,
+        CHATBOT_DB_PASSWORD and CHATBOT_DB_NAME environment variables.
+
+        Args:
+            pool_size (int): Maximum number of open connections
+            connect_args (dict): Passed through to mysql.connector.connect
+            **options: Passed through to AnswerStore
+
+        Returns:
+            AnswerStore: Store using '%s' placeholders and prepared cursors
+        """
+        import mysql.connector
+
+        settings = {
+            'host': os.environ.get('CHATBOT_DB_HOST', 'localhost'),
+            'user': os.environ.get('CHATBOT_DB_USER', 'root'),
+            'password': os.environ.get('CHATBOT_DB_PASSWORD', ''),
+            'database': os.environ.get('CHATBOT_DB_NAME', 'chatbot'),
+        }
+        settings.update(connect_args or {})
+
+        return cls(
+            ConnectionPool(lambda: mysql.connector.connect(**settings), size=pool_size),
+            placeholder='%s',
+            cursor_options={'prepared': True},
+            **options
+        )
+
+    def create_schema(self):
+        """Create the answers table if it does not exist"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                f"CREATE TABLE IF NOT EXISTS {self.table} "
+                "(intent VARCHAR(100) PRIMARY KEY, answer TEXT NOT NULL)"
+            )
+            cursor.close()
+            conn.commit()
+
+    def set_answers(self, answers):
+        """
+        Insert or replace answers for intents
+
+        Args:
+            answers (dict): Mapping of intent label to answer text
+        """
+        query = f"REPLACE INTO {self.table} (intent, answer) VALUES ({self.placeholder}, {self.placeholder})"
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(**self.cursor_options)
+            cursor.executemany(query, list(answers.items()))
+            cursor.close()
+            conn.commit()
+        with self._cache_lock:
+            self._generation += 1
+            for intent in answers:
+                self.cache.discard(intent)
+
+    def get_answer(self, intent):
+        """
+        Look up the answer for one intent
+
+        Args:
+            intent (str): Intent label
+
+        Returns:
+            str or None: Answer text, or None if the intent has no answer
+        """
+        return self.get_answers([intent])[intent]
+
+    def get_answers(self, intents):
+        """
+        Look up answers for many intents with as few queries as possible
+
+        Args:
+            intents (iterable): Intent labels
+
+        Returns:
+            dict: Mapping of each intent to its answer (None if missing)
+        """
+        results = {}
+        misses = []
+        for intent in dict.fromkeys(intents):
+            cached = self.cache.get(intent)
+            if cached is None:
+                misses.append(intent)
+            else:
+                results[intent] = None if cached is _NO_ANSWER else cached
+
+        if misses:
+            generation = self._generation
+            fetched = self._fetch(misses)
+            for intent in misses:
+                results[intent] = fetched.get(intent)
+            with self._cache_lock:
+                # A write committed during the fetch may have made these rows stale
+                if generation == self._generation:
+                    for intent in misses:
+                        answer = results[intent]
+                        self.cache.put(intent, _NO_ANSWER if answer is None else answer)
+        return results
+
+    def answer_predictions(self, predictions):
+        """
+        Attach the answer for each prediction's top intent
+
+        Args:
+            predictions (list): Output of IntentClassifier.predict()
+
+        Returns:
+            list: The same predictions, each with 'intent' and 'answer' keys added
+        """
+        top_intents = [next(iter(pred['categories']), None) for pred in predictions]
+        answers = self.get_answers(intent for intent in top_intents if intent is not None)
+        for pred, intent in zip(predictions, top_intents):
+            pred['intent'] = intent
+            pred['answer'] = answers.get(intent)
+        return predictions
+
+    async def aget_answer(self, intent):
+        """Async version of get_answer(), run on the store's thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.get_answer, intent)
+
+    async def aget_answers(self, intents):
+        """Async version of get_answers(), run on the store's thread pool"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self.get_answers, list(intents))
+
+    def close(self):
+        """Shut down the async worker threads and close pooled connections"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+
+    def _fetch(self, intents):
+        if self.metrics is not None:
+            self.metrics.observe('db.batch_size', len(intents))
+            with self.metrics.timer('db.query_seconds'):
+                return self._query(intents)
+        return self._query(intents)
+
+    def _query(self, intents):
+        found = {}
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(**self.cursor_options)
+            try:
+                for start in range(0, len(intents), _IN_BUCKETS[-1]):
+                    chunk = intents[start:start + _IN_BUCKETS[-1]]
+                    size = next(bucket for bucket in _IN_BUCKETS if bucket >= len(chunk))
+                    # Pad with a repeated intent so the statement text is reused
+                    params = chunk + [chunk[-1]] * (size - len(chunk))
+                    markers = ', '.join([self.placeholder] * size)
+                    cursor.execute(
+                        f"SELECT intent, answer FROM {self.table} WHERE intent IN ({markers})",
+                        params
+                    )
+                    found.update(cursor.fetchall())
+            finally:
+                cursor.close()
+        return found
@@ -0,0 +1,213 @@
+import argparse
+import csv
+import io
+import json
+import os
+import sys
+import time
+from collections import deque
+
+from model import IntentClassifier
+
+
+def read_records(path, start_offset=0, text_field='text'):
+    """
+    Stream records from a JSONL or CSV file, starting at a byte offset
+
+    Args:
+        path (str): Input file (.csv for CSV, anything else is read as JSONL)
+        start_offset (int): Byte offset of the first record to read
+        text_field (str): JSON key or CSV column holding the query text
+
+    Yields:
+        tuple: (byte offset just past the record, record dict)
+    """
+    with open(path, 'rb') as f:
+        header = None
+        if path.endswith('.csv'):
+            header = next(csv.reader([f.readline().decode('utf-8-sig')]))
+            if text_field not in header:
+                raise ValueError(f"{path} has no '{text_field}' column")
+            start_offset = max(start_offset, f.tell())
+        f.seek(start_offset)
+        offset = start_offset
+
+        def lines():
+            nonlocal offset
+            for line in iter(f.readline, b''):
+                offset += len(line)
+                yield line.decode('utf-8')
+
+        if header is not None:
+            # csv.reader pulls only the lines of one record at a time, so the
+            # offset is at a record boundary after each row
+            for row in csv.reader(lines()):
+                if row:
+                    yield offset, dict(zip(header, row))
+        else:
+            for line in lines():
+                if not line.strip():
+                    continue
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    raise ValueError(f"{path}: invalid JSON at byte {offset - len(line.encode('utf-8'))}") from None
+                if not isinstance(record, dict) or not isinstance(record.get(text_field), str):
+                    raise ValueError(f"{path}: record without a '{text_field}' string near byte {offset}")
+                yield offset, record
+
+
+def load_checkpoint(path, input_path):
+    """
+    Read a checkpoint, ignoring one written for a different input file
+
+    Returns:
+        dict or None: Checkpoint with input_offset, output_offset and records
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        checkpoint = json.load(f)
+    if checkpoint.get('input') != os.path.abspath(input_path):
+        print(f"Checkpoint {path} belongs to {checkpoint.get('input')}; starting over.")
+        return None
+    return checkpoint
+
+
+def save_checkpoint(path, checkpoint):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def format_duration(seconds):
+    seconds = int(seconds)
+    return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+
+
+def backfill(classifier, input_path, output_path, checkpoint_path=None, text_field='text',
+             batch_size=256, n_process=1, checkpoint_every=10000, all_scores=False, restart=False):
+    """
+    Classify every record of a large file, writing predictions as JSONL
+
+    Records are streamed from the input and through predict_stream(), so
+    memory use does not depend on the file size. Every checkpoint_every
+    records the output is flushed and the input/output byte offsets are
+    saved; an interrupted run resumes from the last checkpoint.
+
+    Args:
+        classifier (IntentClassifier): Classifier to label with
+        input_path (str): JSONL or CSV input
+        output_path (str): JSONL output; each line is the input record plus
+            'intent' and 'confidence' (and 'categories' with all_scores)
+        checkpoint_path (str): Checkpoint file (defaults to output_path + '.checkpoint')
+        text_field (str): JSON key or CSV column holding the query text
+        batch_size (int): Texts per nlp.pipe batch
+        n_process (int): Worker processes for classification
+        checkpoint_every (int): Records between checkpoints
+        all_scores (bool): Include every category score in the output
+        restart (bool): Ignore any existing checkpoint
+
+    Returns:
+        int: Total number of records written, including earlier runs
+    """
+    checkpoint_path = checkpoint_path or f"{output_path}.checkpoint"
+    checkpoint = None if restart else load_checkpoint(checkpoint_path, input_path)
+    if checkpoint is None:
+        checkpoint = {'input': os.path.abspath(input_path), 'input_offset': 0, 'output_offset': 0, 'records': 0}
+    else:
+        print(f"Resuming after {checkpoint['records']} records")
+
+    total_bytes = os.path.getsize(input_path)
+    start_offset = checkpoint['input_offset']
+    started = time.monotonic()
+    done = checkpoint_start = checkpoint['records']
+
+    # Records wait here while their texts are being classified
+    pending = deque()
+
+    def texts():
+        for offset, record in read_records(input_path, start_offset, text_field):
+            pending.append((offset, record))
+            yield record[text_field]
+
+    mode = 'r+b' if os.path.exists(output_path) and checkpoint['output_offset'] else 'wb'
+    with open(output_path, mode) as out:
+        # Drop anything written after the last checkpoint
+        out.seek(checkpoint['output_offset'])
+        out.truncate()
+        writer = io.TextIOWrapper(out, encoding='utf-8', newline='\n', write_through=True)
+
+        offset = start_offset
+        since_checkpoint = 0
+        for prediction in classifier.predict_stream(texts(), batch_size=batch_size, n_process=n_process):
+            offset, record = pending.popleft()
+            categories = prediction['categories']
+            intent, confidence = next(iter(categories.items()), (None, 0.0))
+            result = {**record, 'intent': intent, 'confidence': confidence}
+            if all_scores:
+                result['categories'] = categories
+            writer.write(json.dumps(result) + '\n')
+            done += 1
+            since_checkpoint += 1
+
+            if since_checkpoint >= checkpoint_every:
+                writer.flush()
+                os.fsync(out.fileno())
+                checkpoint.update(input_offset=offset, output_offset=out.tell(), records=done)
+                save_checkpoint(checkpoint_path, checkpoint)
+                since_checkpoint = 0
+                report_progress(done, done - checkpoint_start, offset - start_offset, total_bytes - offset, started)
+
+        writer.flush()
+        writer.detach()
+
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.monotonic() - started
+    print(f"Done: {done} records written to {output_path} in {format_duration(elapsed)}")
+    return done
+
+
+def report_progress(done, done_this_run, bytes_done, bytes_left, started):
+    """Print throughput and an ETA based on the share of the input consumed"""
+    elapsed = max(time.monotonic() - started, 1e-9)
+    byte_rate = bytes_done / elapsed
+    eta = format_duration(bytes_left / byte_rate) if byte_rate else '?'
+    print(f"{done} records, {done_this_run / elapsed:.0f} records/s, "
+          f"{byte_rate / 1e6:.2f} MB/s, ETA {eta}", file=sys.stderr, flush=True)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Classify archived queries in bulk with resumable checkpoints")
+    parser.add_argument('input', help="JSONL or CSV file of queries")
+    parser.add_argument('output', help="JSONL file to write predictions to")
+    parser.add_argument('--model-path', default='intent_model')
+    parser.add_argument('--text-field', default='text', help="JSON key or CSV column holding the query")
+    parser.add_argument('--batch-size', type=int, default=256)
+    parser.add_argument('--processes', type=int, default=1, help="Worker processes (-1 for all cores)")
+    parser.add_argument('--checkpoint', help="Checkpoint file (default: OUTPUT.checkpoint)")
+    parser.add_argument('--checkpoint-every', type=int, default=10000)
+    parser.add_argument('--all-scores', action='store_true', help="Write every category score")
+    parser.add_argument('--restart', action='store_true', help="Ignore an existing checkpoint")
+    args = parser.parse_args()
+
+    classifier = IntentClassifier(model_path=args.model_path)
+    classifier.load_model()
+
+    backfill(
+        classifier,
+        args.input,
+        args.output,
+        checkpoint_path=args.checkpoint,
+        text_field=args.text_field,
+        batch_size=args.batch_size,
+        n_process=args.processes,
+        checkpoint_every=args.checkpoint_every,
+        all_scores=args.all_scores,
+        restart=args.restart
+    )
+
+if __name__ == "__main__":
+    main()
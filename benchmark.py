@@ -0,0 +1,268 @@
+import argparse
+import json
+import multiprocessing
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data_pipeline import iter_records
+from model import IntentClassifier
+
+# Metrics whose names end in one of these are better when lower
+_LOWER_IS_BETTER = ('_ms', '_seconds', '_mb')
+
+_PREFIXES = ['', '', 'Hi, ', 'Please tell me ', 'Quick question: ', 'Can you help? ', 'Hello! ']
+_SUFFIXES = ['', '', ' Thanks.', ' Please reply soon.', ' I am a first year student.', ' for 2025']
+
+
+def synthetic_corpus(source_path, size, seed=0):
+    """
+    Generate labelled queries by perturbing the rows of an existing corpus
+
+    Each synthetic row takes a random source row, keeps its label and adds a
+    random prefix/suffix and word-order jitter, so the label distribution and
+    vocabulary match the real data at any corpus size.
+
+    Args:
+        source_path (str): Training data the label set and texts come from
+        size (int): Number of rows to generate
+        seed (int): Random seed
+
+    Returns:
+        list: (text, cats) pairs
+    """
+    rng = random.Random(seed)
+    rows = [(text, cats) for _, text, cats in iter_records(source_path)]
+    labels = sorted({label for _, cats in rows for label in cats})
+
+    corpus = []
+    for i in range(size):
+        text, cats = rng.choice(rows)
+        words = text.rstrip('?.!').split()
+        if len(words) > 3 and rng.random() < 0.5:
+            j = rng.randrange(1, len(words) - 1)
+            words[j], words[j + 1] = words[j + 1], words[j]
+        text = f"{rng.choice(_PREFIXES)}{' '.join(words)}?{rng.choice(_SUFFIXES)} #{i}"
+        corpus.append((text, {label: bool(cats.get(label, False)) for label in labels}))
+    return corpus
+
+
+def write_corpus(corpus, path):
+    """Write (text, cats) pairs as JSONL"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for text, cats in corpus:
+            f.write(json.dumps({'text': text, 'cats': cats}) + '\n')
+
+
+def percentile(values, pct):
+    """Nearest-rank percentile of a list of numbers"""
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process so far, in MB"""
+    # Linux keeps ru_maxrss across exec, so a spawned process would report its
+    # parent's peak; VmHWM belongs to the current address space only
+    try:
+        with open('/proc/self/status', 'r', encoding='ascii') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return usage / scale
+
+
+def _memory_profile(model_path, texts, batch_size):
+    """Peak RSS after imports, after loading and after serving; run in a fresh process"""
+    import spacy  # noqa: F401  (counted in the baseline, not the model)
+
+    results = {'memory.baseline_rss_mb': peak_rss_mb()}
+    classifier = IntentClassifier(model_path=model_path)
+    classifier.load_model()
+    results['memory.loaded_rss_mb'] = peak_rss_mb()
+    for _ in classifier.predict_stream(texts, batch_size=batch_size):
+        pass
+    results['memory.serving_rss_mb'] = peak_rss_mb()
+    return results
+
+
+def bench_memory(model_path, texts, batch_size=64):
+    """
+    Measure the memory cost of loading and serving a model
+
+    ru_maxrss only ever grows, so the measurement runs in a freshly spawned
+    process that has not trained or loaded anything else.
+
+    Args:
+        model_path (str): Saved model
+        texts (list): Texts classified after loading
+        batch_size (int): Texts per nlp.pipe batch
+
+    Returns:
+        dict: Peak RSS at each stage, plus the growth caused by loading and serving
+    """
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+        results = pool.submit(_memory_profile, model_path, texts, batch_size).result()
+    results['memory.load_delta_mb'] = results['memory.loaded_rss_mb'] - results['memory.baseline_rss_mb']
+    results['memory.serving_delta_mb'] = results['memory.serving_rss_mb'] - results['memory.loaded_rss_mb']
+    return results
+
+
+def bench_training(source_path, sizes, work_dir, epochs):
+    """Time a full train_model() run for each corpus size"""
+    results = {}
+    for size in sizes:
+        corpus_path = os.path.join(work_dir, f"corpus_{size}.jsonl")
+        write_corpus(synthetic_corpus(source_path, size), corpus_path)
+        classifier = IntentClassifier(
+            model_path=os.path.join(work_dir, f"model_{size}"),
+            best_model_path=os.path.join(work_dir, f"best_{size}")
+        )
+        start = time.perf_counter()
+        classifier.train_model(corpus_path, force_retrain=True, max_epochs=epochs, patience=epochs)
+        results[f"train.rows{size}_seconds"] = time.perf_counter() - start
+    return results
+
+
+def bench_load(model_path, work_dir):
+    """Time loading a model from its directory and from a single-file artifact"""
+    results = {}
+    classifier = IntentClassifier(model_path=model_path)
+    start = time.perf_counter()
+    classifier.load_model()
+    results['load.directory_seconds'] = time.perf_counter() - start
+
+    artifact_path = os.path.join(work_dir, 'model.bin')
+    classifier.export_model(artifact_path)
+    start = time.perf_counter()
+    IntentClassifier(model_path=artifact_path).load_model()
+    results['load.artifact_seconds'] = time.perf_counter() - start
+    return results
+
+
+def bench_latency(classifier, texts):
+    """Single-query latency percentiles"""
+    timings = []
+    for text in texts:
+        start = time.perf_counter()
+        classifier.predict(text)
+        timings.append((time.perf_counter() - start) * 1000)
+    return {
+        'predict.latency_p50_ms': statistics.median(timings),
+        'predict.latency_p99_ms': percentile(timings, 99),
+    }
+
+
+def bench_throughput(classifier, texts, batch_sizes, process_counts):
+    """Batch throughput in texts per second for each batch size and process count"""
+    results = {}
+    for n_process in process_counts:
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            for _ in classifier.predict_stream(texts, batch_size=batch_size, n_process=n_process):
+                pass
+            elapsed = time.perf_counter() - start
+            results[f"predict.throughput.batch{batch_size}.proc{n_process}"] = len(texts) / elapsed
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """
+    Find metrics that regressed against a baseline
+
+    Args:
+        results (dict): Current metrics
+        baseline (dict): Baseline metrics
+        tolerance (float): Allowed relative change before flagging, e.g. 0.2
+
+    Returns:
+        list: (metric, baseline value, current value) for each regression
+    """
+    regressions = []
+    for name, base in baseline.items():
+        current = results.get(name)
+        if current is None or not base:
+            continue
+        if name.endswith(_LOWER_IS_BETTER):
+            regressed = current > base * (1 + tolerance)
+        else:
+            regressed = current < base * (1 - tolerance)
+        if regressed:
+            regressions.append((name, base, current))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark intent classification, training and loading")
+    parser.add_argument('--train-data', default='train_data.json')
+    parser.add_argument('--queries', type=int, default=2000, help="Queries per throughput run")
+    parser.add_argument('--latency-queries', type=int, default=500)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 64, 256])
+    parser.add_argument('--processes', type=int, nargs='+', default=[1, 2])
+    parser.add_argument('--train-sizes', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--train-epochs', type=int, default=3)
+    parser.add_argument('--output', default='bench_results.json')
+    parser.add_argument('--baseline', default='bench_baseline.json')
+    parser.add_argument('--save-baseline', action='store_true', help="Store these results as the new baseline")
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        metrics = bench_training(args.train_data, args.train_sizes, work_dir, args.train_epochs)
+
+        # Benchmark inference against the model trained on the largest corpus
+        model_path = os.path.join(work_dir, f"model_{max(args.train_sizes)}")
+        metrics.update(bench_load(model_path, work_dir))
+        texts = [text for text, _ in synthetic_corpus(args.train_data, args.queries, seed=1)]
+        metrics.update(bench_memory(model_path, texts))
+
+        classifier = IntentClassifier(model_path=model_path)
+        classifier.load_model()
+        classifier.predict(texts[:10])  # warm up
+        metrics.update(bench_latency(classifier, texts[:args.latency_queries]))
+        metrics.update(bench_throughput(classifier, texts, args.batch_sizes, args.processes))
+
+    report = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'metrics': metrics,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(report, f, indent=2)
+
+    for name, value in sorted(metrics.items()):
+        print(f"{name}: {value:.4f}")
+    print(f"Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+        return
+
+    if os.path.exists(args.baseline):
+        with open(args.baseline, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)['metrics']
+        regressions = compare(metrics, baseline, args.tolerance)
+        for name, base, current in regressions:
+            print(f"REGRESSION {name}: {base:.4f} -> {current:.4f}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regressions beyond {args.tolerance:.0%} against {args.baseline}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def normalize_text(text):
+    """
+    Fold a query to the form used as a cache key
+
+    Case, punctuation and runs of whitespace are folded so that
+    "What's the FEE structure?" and "whats the fee structure" share an entry.
+
+    Args:
+        text (str): Raw query text
+
+    Returns:
+        str: Normalized text
+    """
+    text = unicodedata.normalize('NFKC', text).lower()
+    # Drop apostrophes so contractions stay one word, split on other punctuation
+    text = text.replace("'", '').replace('\u2019', '')
+    text = ''.join(
+        ' ' if unicodedata.category(ch).startswith('P') else ch
+        for ch in text
+    )
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class PredictionCache:
+    def __init__(self, max_size=10000, ttl=None, key=normalize_text):
+        """
+        Bounded LRU cache of predicted categories keyed on normalized text
+
+        Args:
+            max_size (int): Maximum number of entries kept
+            ttl (float): Seconds an entry stays valid (None for no expiry)
+            key (callable): Maps a text to its cache key; pass an identity
+                function for lookups that must match exactly, such as labels
+        """
+        self.max_size = max_size
+        self.ttl = ttl
+        self.key = key
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._model_token = None
+        self._lock = threading.Lock()
+
+    def bind(self, model_token):
+        """
+        Tie the cache to a loaded model, dropping entries from any other model
+
+        Args:
+            model_token: Identity of the currently loaded model
+        """
+        with self._lock:
+            if model_token != self._model_token:
+                self._entries.clear()
+                self._model_token = model_token
+
+    def get(self, text):
+        """
+        Look up cached categories for a text
+
+        Args:
+            text (str): Raw query text
+
+        Returns:
+            dict or None: Cached categories, or None on a miss
+        """
+        key = self.key(text)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                categories, expires = entry
+                if expires is None or expires > time.monotonic():
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return categories
+                del self._entries[key]
+            self.misses += 1
+            return None
+
+    def put(self, text, categories, model_token=None):
+        """
+        Store categories for a text, evicting the least recently used entry if full
+
+        Args:
+            text (str): Raw query text
+            categories (dict): Categories sorted by confidence
+            model_token: Model that produced the categories; if given and the
+                cache has since been bound to another model, nothing is stored
+        """
+        key = self.key(text)
+        expires = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if model_token is not None and model_token != self._model_token:
+                return
+            self._entries[key] = (categories, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def discard(self, text):
+        """
+        Drop the entry for a text, if any, keeping the counters
+
+        Args:
+            text (str): Raw query text
+        """
+        with self._lock:
+            self._entries.pop(self.key(text), None)
+
+    def clear(self):
+        """Remove all entries and reset the counters"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """
+        Report cache effectiveness
+
+        Returns:
+            dict: Entry count, hits, misses and hit rate
+        """
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': self.hits / lookups if lookups else 0.0,
+            }
+
+    def __len__(self):
+        return len(self._entries)
@@ -1,5 +1,7 @@
 import json
 
+from data_pipeline import prepare_corpus
+
 # Data to be converted to JSON
 train_data = [
     ("What is the admission process for engineering colleges?", {'cats': {'admission_process': True, 'general_college_info': False, 'fee_structure': False, 'scholarships': False, 'hostel_facilities': False, 'curriculum': False}}),
@@ -33,9 +35,10 @@ train_data = [
     ("Can I get a list of colleges with their last year's admission statistics?", {'cats': {'admission_process': False, 'general_college_info': False, 'fee_structure': False, 'scholarships': False, 'hostel_facilities': False, 'cutoff': True}}),
 ]
 
-# Save to JSON file
-file_path = "train_data.json"
-with open(file_path, 'w') as json_file:
-    json.dump(train_data, json_file, indent=4)
+# Save to JSONL, one row per line, then validate and label-complete it for training
+file_path = "train_data.jsonl"
+with open(file_path, 'w', encoding='utf-8') as jsonl_file:
+    for text, annotations in train_data:
+        jsonl_file.write(json.dumps({'text': text, 'cats': annotations['cats']}) + '\n')
 
-file_path
+prepare_corpus(file_path, "train_data.prepared.jsonl")
@@ -0,0 +1,252 @@
+import hashlib
+import json
+import os
+import random
+import zlib
+
+from cache import normalize_text
+
+
+def iter_records(path):
+    """
+    Stream raw (text, cats) records from a training data file
+
+    JSONL files are read one line at a time and may hold either
+    {"text": ..., "cats": {...}} objects or [text, {"cats": {...}}] pairs.
+    Legacy .json files (a single list of pairs, as written by
+    convert_json.py before JSONL) are loaded whole.
+
+    Args:
+        path (str): Path to a .jsonl or .json training data file
+
+    Yields:
+        tuple: (line number, text, cats) for each row, validated
+    """
+    if path.endswith('.jsonl'):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if line.strip():
+                    yield (line_number, *validate_record(json.loads(line), path, line_number))
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            rows = json.load(f)
+        for row_number, row in enumerate(rows, 1):
+            yield (row_number, *validate_record(row, path, row_number))
+
+
+def validate_record(row, path='<memory>', line_number=0):
+    """
+    Check a raw training row and normalise it to (text, cats)
+
+    Args:
+        row (dict or list): Raw row in either supported layout
+        path (str): Source file, used in error messages
+        line_number (int): Row position, used in error messages
+
+    Returns:
+        tuple: (text, cats) with cats mapping label to bool
+
+    Raises:
+        ValueError: If the row is malformed
+    """
+    where = f"{path}:{line_number}"
+    if isinstance(row, dict):
+        text, cats = row.get('text'), row.get('cats')
+    elif isinstance(row, (list, tuple)) and len(row) == 2 and isinstance(row[1], dict):
+        text, cats = row[0], row[1].get('cats')
+    else:
+        raise ValueError(f"{where}: expected {{'text', 'cats'}} or [text, {{'cats'}}]")
+
+    if not isinstance(text, str) or not text.strip():
+        raise ValueError(f"{where}: text must be a non-empty string")
+    if not isinstance(cats, dict) or not cats:
+        raise ValueError(f"{where}: cats must be a non-empty object")
+    for label, value in cats.items():
+        if not isinstance(label, str) or not isinstance(value, (bool, int, float)):
+            raise ValueError(f"{where}: invalid category {label!r}: {value!r}")
+    if sum(1 for value in cats.values() if value) != 1:
+        raise ValueError(f"{where}: exactly one category must be true")
+
+    return text.strip(), {label: bool(value) for label, value in cats.items()}
+
+
+def prepare_corpus(source_path, prepared_path):
+    """
+    Validate, deduplicate and label-complete a corpus into prepared JSONL
+
+    The source is streamed twice: once to collect the full label set, once
+    to write every unique row with a value for every label. Rows whose
+    normalized text was already seen are dropped, keeping the first.
+
+    Args:
+        source_path (str): Raw .jsonl or .json training data
+        prepared_path (str): Prepared JSONL file to write
+
+    Returns:
+        dict: Row counts and the sorted label set
+    """
+    labels = set()
+    for _, _, cats in iter_records(source_path):
+        labels.update(cats)
+    labels = sorted(labels)
+
+    seen = set()
+    written = duplicates = 0
+    tmp_path = f"{prepared_path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as out:
+        for _, text, cats in iter_records(source_path):
+            key = hashlib.blake2b(normalize_text(text).encode('utf-8'), digest_size=8).digest()
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            full_cats = {label: cats.get(label, False) for label in labels}
+            out.write(json.dumps({'text': text, 'cats': full_cats}) + '\n')
+            written += 1
+    os.replace(tmp_path, prepared_path)
+
+    print(f"Prepared {written} rows ({duplicates} duplicates dropped) to {prepared_path}")
+    return {'rows': written, 'duplicates': duplicates, 'labels': labels}
+
+
+def ensure_prepared(source_path):
+    """
+    Return a prepared corpus for a source file, preparing it only if stale
+
+    Args:
+        source_path (str): Raw or already prepared training data
+
+    Returns:
+        str: Path to the prepared JSONL corpus
+    """
+    if source_path.endswith('.prepared.jsonl'):
+        return source_path
+
+    prepared_path = f"{os.path.splitext(source_path)[0]}.prepared.jsonl"
+    if (not os.path.exists(prepared_path)
+            or os.path.getmtime(prepared_path) < os.path.getmtime(source_path)):
+        prepare_corpus(source_path, prepared_path)
+    return prepared_path
+
+
+def read_labels(prepared_path):
+    """
+    Read the label set of a prepared corpus from its first row
+
+    Args:
+        prepared_path (str): Prepared JSONL corpus
+
+    Returns:
+        list: Sorted labels
+    """
+    for row in iter_prepared(prepared_path):
+        return sorted(row['cats'])
+    return []
+
+
+def iter_prepared(prepared_path):
+    """
+    Stream rows from a prepared corpus
+
+    Args:
+        prepared_path (str): Prepared JSONL corpus
+
+    Yields:
+        dict: Row with 'text' and complete 'cats'
+    """
+    with open(prepared_path, 'r', encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+
+def is_dev(text, dev_split):
+    """
+    Deterministically assign a text to the dev split by hashing it
+
+    Args:
+        text (str): Example text
+        dev_split (float): Fraction of texts to assign to dev
+
+    Returns:
+        bool: True if the text belongs to the dev split
+    """
+    return zlib.crc32(text.encode('utf-8')) % 10000 < dev_split * 10000
+
+
+def iter_examples(nlp, prepared_path, dev_split=0.0, dev=False, shuffle_buffer=0, seed=0):
+    """
+    Stream spaCy Examples from a prepared corpus
+
+    Args:
+        nlp (Language): Pipeline used to make docs
+        prepared_path (str): Prepared JSONL corpus
+        dev_split (float): Fraction of texts held out as dev
+        dev (bool): Yield the dev split instead of the training split
+        shuffle_buffer (int): Size of the buffer used for approximate
+            shuffling (0 keeps file order)
+        seed (int): Seed for the shuffle buffer
+
+    Yields:
+        Example: One example per selected row
+    """
+    from spacy.training import Example
+
+    def examples():
+        for row in iter_prepared(prepared_path):
+            if is_dev(row['text'], dev_split) == dev:
+                yield Example.from_dict(nlp.make_doc(row['text']), {'cats': row['cats']})
+
+    if shuffle_buffer > 1:
+        yield from shuffled(examples(), shuffle_buffer, random.Random(seed))
+    else:
+        yield from examples()
+
+
+def shuffled(items, buffer_size, rng):
+    """
+    Approximately shuffle a stream with a bounded buffer
+
+    Args:
+        items (iterable): Items to shuffle
+        buffer_size (int): Number of items held at once
+        rng (random.Random): Random source
+
+    Yields:
+        Items in shuffled order
+    """
+    buffer = []
+    for item in items:
+        if len(buffer) < buffer_size:
+            buffer.append(item)
+            continue
+        index = rng.randrange(buffer_size)
+        yield buffer[index]
+        buffer[index] = item
+    rng.shuffle(buffer)
+    yield from buffer
+
+
+def reservoir_sample(items, k, rng):
+    """
+    Draw a uniform sample of k items from a stream of unknown length
+
+    Args:
+        items (iterable): Items to sample from
+        k (int): Sample size
+        rng (random.Random): Random source
+
+    Returns:
+        list: Up to k sampled items
+    """
+    sample = []
+    if k <= 0:
+        return sample
+    for seen, item in enumerate(items):
+        if seen < k:
+            sample.append(item)
+        else:
+            index = rng.randint(0, seen)
+            if index < k:
+                sample[index] = item
+    return sample
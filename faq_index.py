@@ -0,0 +1,188 @@
+import json
+import os
+
+from model import _write_dir_atomic
+
+# Files making up an index directory; the arrays are loaded as read-only memory maps
+_ARRAYS = ('data', 'indices', 'indptr', 'idf')
+_META_FILE = 'meta.json'
+
+
+def _vectorizer(n_features):
+    from sklearn.feature_extraction.text import HashingVectorizer
+
+    return HashingVectorizer(
+        n_features=n_features,
+        ngram_range=(1, 2),
+        alternate_sign=False,
+        norm=None,
+    )
+
+
+class FaqIndex:
+    def __init__(self, index_dir):
+        """
+        Nearest-neighbour index over canonical FAQ question/answer pairs
+
+        Questions are stored as L2-normalized hashed TF-IDF rows in a CSR
+        matrix whose arrays are memory-mapped from index_dir, sorted by
+        intent so each intent's questions form one contiguous partition.
+        Similarity is the dot product of query and question rows.
+
+        Args:
+            index_dir (str): Directory written by FaqIndex.build()
+        """
+        import numpy as np
+        from scipy.sparse import csr_matrix
+
+        # Resolve the symlink once so a concurrent rebuild can't mix two indexes
+        data_dir = os.path.realpath(index_dir)
+        with open(os.path.join(data_dir, _META_FILE), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        arrays = {
+            name: np.load(os.path.join(data_dir, f"{name}.npy"), mmap_mode='r')
+            for name in _ARRAYS
+        }
+
+        self.index_dir = index_dir
+        self.n_features = meta['n_features']
+        self.questions = meta['questions']
+        self.answers = meta['answers']
+        self.intents = meta['intents']
+        self.partitions = {intent: tuple(bounds) for intent, bounds in meta['partitions'].items()}
+        self.idf = arrays['idf']
+        self.matrix = csr_matrix(
+            (arrays['data'], arrays['indices'], arrays['indptr']),
+            shape=(len(self.questions), self.n_features),
+            copy=False
+        )
+        self.vectorizer = _vectorizer(self.n_features)
+
+    @staticmethod
+    def build(faq_path, index_dir, n_features=2 ** 16):
+        """
+        Build an index from a JSONL file of FAQ entries
+
+        Each line holds {"question": ..., "answer": ..., "intent": ...}.
+        The index is written to a new directory and index_dir, a symlink,
+        is switched over to it atomically (see model._write_dir_atomic).
+
+        Args:
+            faq_path (str): FAQ entries
+            index_dir (str): Directory to write the index to
+            n_features (int): Size of the hashed feature space
+
+        Returns:
+            FaqIndex: The loaded index
+
+        Raises:
+            ValueError: If an entry is malformed or the file has no entries
+        """
+        import numpy as np
+        from sklearn.preprocessing import normalize
+
+        entries = []
+        with open(faq_path, 'r', encoding='utf-8') as f:
+            for line_number, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                if not all(isinstance(entry.get(key), str) for key in ('question', 'answer', 'intent')):
+                    raise ValueError(f"{faq_path}:{line_number}: expected question, answer and intent strings")
+                entries.append(entry)
+        if not entries:
+            raise ValueError(f"{faq_path} has no FAQ entries")
+        entries.sort(key=lambda entry: entry['intent'])
+
+        partitions = {}
+        for row, entry in enumerate(entries):
+            start, _ = partitions.get(entry['intent'], (row, row))
+            partitions[entry['intent']] = (start, row + 1)
+
+        counts = _vectorizer(n_features).transform(entry['question'] for entry in entries).tocsr()
+        document_frequency = np.bincount(counts.indices, minlength=n_features)
+        idf = (np.log((1 + len(entries)) / (1 + document_frequency)) + 1).astype(np.float32)
+        matrix = normalize(counts.multiply(idf).tocsr().astype(np.float32))
+
+        arrays = {'data': matrix.data, 'indices': matrix.indices, 'indptr': matrix.indptr, 'idf': idf}
+
+        def write(tmp_dir):
+            for name in _ARRAYS:
+                np.save(os.path.join(tmp_dir, f"{name}.npy"), arrays[name])
+            with open(os.path.join(tmp_dir, _META_FILE), 'w', encoding='utf-8') as f:
+                json.dump({
+                    'n_features': n_features,
+                    'questions': [entry['question'] for entry in entries],
+                    'answers': [entry['answer'] for entry in entries],
+                    'intents': [entry['intent'] for entry in entries],
+                    'partitions': partitions,
+                }, f)
+
+        _write_dir_atomic(index_dir, write)
+        print(f"FAQ index with {len(entries)} entries written to {index_dir}")
+        return FaqIndex(index_dir)
+
+    def search(self, texts, intents=None, min_score=0.0):
+        """
+        Find the closest FAQ entry for each query
+
+        Args:
+            texts (list): Query texts
+            intents (list): Predicted intent per query; when given, each
+                query is only compared with its intent's partition
+            min_score (float): Cosine similarity below which no match is returned
+
+        Returns:
+            list: For each query a dict with question, answer, intent and
+                score, or None if nothing scored at least min_score
+        """
+        import numpy as np
+        from sklearn.preprocessing import normalize
+
+        if not texts:
+            return []
+        queries = normalize(self.vectorizer.transform(texts).multiply(self.idf).tocsr())
+
+        # Group queries by the partition they search, so each group is one product
+        groups = {}
+        for i in range(len(texts)):
+            if intents is None:
+                bounds = (0, len(self.questions))
+            else:
+                bounds = self.partitions.get(intents[i])
+                if bounds is None:
+                    continue
+            groups.setdefault(bounds, []).append(i)
+
+        results = [None] * len(texts)
+        for (start, end), rows in groups.items():
+            scores = (queries[rows] @ self.matrix[start:end].T).toarray()
+            best = scores.argmax(axis=1)
+            for row, column, score in zip(rows, best, scores[np.arange(len(rows)), best]):
+                if score < min_score or score <= 0:
+                    continue
+                entry = start + column
+                results[row] = {
+                    'question': self.questions[entry],
+                    'answer': self.answers[entry],
+                    'intent': self.intents[entry],
+                    'score': float(score),
+                }
+        return results
+
+    def answer_predictions(self, predictions, min_score=0.3):
+        """
+        Attach the closest FAQ answer within each prediction's top intent
+
+        Args:
+            predictions (list): Output of IntentClassifier.predict()
+            min_score (float): Minimum similarity for a match
+
+        Returns:
+            list: The same predictions, each with a 'faq' key (None if no match)
+        """
+        texts = [pred['text'] for pred in predictions]
+        intents = [next(iter(pred['categories']), None) for pred in predictions]
+        for pred, match in zip(predictions, self.search(texts, intents, min_score)):
+            pred['faq'] = match
+        return predictions
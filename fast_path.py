@@ -0,0 +1,186 @@
+import os
+import pickle
+from itertools import islice
+
+from data_pipeline import ensure_prepared, iter_prepared
+
+
+class FastPathClassifier:
+    def __init__(self, n_features=2 ** 18, ngram_range=(1, 2), C=10.0):
+        """
+        Linear intent classifier over hashed word n-grams
+
+        Whole batches are vectorized into one sparse matrix and scored with
+        a single matrix product, so per-query cost is a few microseconds.
+
+        Args:
+            n_features (int): Size of the hashed feature space
+            ngram_range (tuple): Smallest and largest word n-gram used
+            C (float): Inverse regularization strength of the logistic regression
+        """
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.vectorizer = HashingVectorizer(
+            n_features=n_features,
+            ngram_range=ngram_range,
+            alternate_sign=False,
+            norm='l2',
+        )
+        self.C = C
+        self.model = None
+
+    @property
+    def labels(self):
+        return [str(label) for label in self.model.classes_] if self.model is not None else []
+
+    def train(self, train_data_path):
+        """
+        Fit the linear model on a training corpus
+
+        Args:
+            train_data_path (str): Training data (.json, .jsonl or .prepared.jsonl)
+        """
+        from sklearn.linear_model import LogisticRegression
+
+        texts, targets = [], []
+        for row in iter_prepared(ensure_prepared(train_data_path)):
+            texts.append(row['text'])
+            targets.append(max(row['cats'], key=row['cats'].get))
+
+        self.model = LogisticRegression(C=self.C, max_iter=1000)
+        self.model.fit(self.vectorizer.transform(texts), targets)
+        print(f"Fast path trained on {len(texts)} examples")
+
+    def predict_proba(self, texts):
+        """
+        Score a batch of texts
+
+        Args:
+            texts (list): Texts to classify
+
+        Returns:
+            ndarray: One row of label probabilities per text, columns in `labels` order
+        """
+        if self.model is None:
+            raise ValueError("Fast path not trained. Call train() or load() first.")
+        return self.model.predict_proba(self.vectorizer.transform(texts))
+
+    def save(self, path):
+        """Pickle the trained classifier to a file"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            pickle.dump(self, f)
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def load(path):
+        """Load a classifier written by save()"""
+        with open(path, 'rb') as f:
+            return pickle.load(f)
+
+
+class TwoTierClassifier:
+    def __init__(self, classifier, fast_path, threshold=0.3, metrics=None):
+        """
+        Answer confident queries with the fast path and escalate the rest
+
+        A query whose top two fast-path probabilities differ by less than
+        `threshold` is sent to the full spaCy ensemble instead.
+
+        Args:
+            classifier (IntentClassifier): Full ensemble used for low-margin queries
+            fast_path (FastPathClassifier): Trained linear classifier
+            threshold (float): Minimum top-1/top-2 margin the fast path may answer
+            metrics (Metrics): Optional recorder for per-tier counts
+        """
+        self.classifier = classifier
+        self.fast_path = fast_path
+        self.threshold = threshold
+        self.metrics = metrics
+        self.tier_counts = {'fast': 0, 'ensemble': 0}
+
+    def predict(self, texts, batch_size=256, n_process=1):
+        """
+        Predict intent categories, tagging each prediction with the tier that made it
+
+        Args:
+            texts (list or str): Text or list of texts to classify
+            batch_size (int): Number of texts scored per fast-path batch
+            n_process (int): Worker processes for escalated queries
+
+        Returns:
+            list: Predictions for each text, each with a 'tier' key
+        """
+        if isinstance(texts, str):
+            texts = [texts]
+        return list(self.predict_stream(texts, batch_size=batch_size, n_process=n_process))
+
+    def predict_stream(self, texts, batch_size=256, n_process=1):
+        """
+        Lazily predict intent categories for an iterable of texts
+
+        Args:
+            texts (iterable): Texts to classify
+            batch_size (int): Number of texts scored per fast-path batch
+            n_process (int): Worker processes for escalated queries
+
+        Yields:
+            dict: Prediction for each text, in input order
+        """
+        import numpy as np
+
+        labels = self.fast_path.labels
+        texts = iter(texts)
+        while True:
+            batch = list(islice(texts, batch_size))
+            if not batch:
+                return
+
+            probs = self.fast_path.predict_proba(batch)
+            order = np.argsort(-probs, axis=1)
+            rows = np.arange(len(batch))
+            if probs.shape[1] > 1:
+                margins = probs[rows, order[:, 0]] - probs[rows, order[:, 1]]
+            else:
+                margins = probs[:, 0]
+            escalate = np.flatnonzero(margins < self.threshold)
+
+            predictions = [None] * len(batch)
+            if len(escalate):
+                escalated = self.classifier.predict(
+                    [batch[i] for i in escalate],
+                    batch_size=batch_size,
+                    n_process=n_process
+                )
+                for i, prediction in zip(escalate, escalated):
+                    prediction['tier'] = 'ensemble'
+                    predictions[i] = prediction
+
+            for i, prediction in enumerate(predictions):
+                if prediction is None:
+                    predictions[i] = {
+                        'text': batch[i],
+                        'categories': {labels[j]: float(probs[i, j]) for j in order[i]},
+                        'tier': 'fast'
+                    }
+
+            n_fast = len(batch) - len(escalate)
+            self.tier_counts['fast'] += n_fast
+            self.tier_counts['ensemble'] += len(escalate)
+            if self.metrics is not None:
+                self.metrics.increment('two_tier.fast', n_fast)
+                self.metrics.increment('two_tier.ensemble', len(escalate))
+            yield from predictions
+
+    def stats(self):
+        """
+        Report how often each tier answered
+
+        Returns:
+            dict: Per-tier counts and the share answered by the fast path
+        """
+        total = self.tier_counts['fast'] + self.tier_counts['ensemble']
+        return {
+            **self.tier_counts,
+            'fast_rate': self.tier_counts['fast'] / total if total else 0.0,
+        }
@@ -0,0 +1,173 @@
+import json
+import os
+import re
+import threading
+import time
+from contextlib import contextmanager
+
+
+class Metrics:
+    def __init__(self, sinks=None):
+        """
+        In-process counters, gauges and timing summaries
+
+        Components take an optional Metrics instance and skip all recording
+        when it is None, so instrumentation costs nothing unless enabled.
+
+        Args:
+            sinks (list): Objects with an emit(snapshot) method, called by flush()
+        """
+        self.sinks = list(sinks or [])
+        self._counters = {}
+        self._gauges = {}
+        self._summaries = {}
+        self._caches = {}
+        self._lock = threading.Lock()
+
+    def increment(self, name, value=1):
+        """Add to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def gauge(self, name, value):
+        """Set a gauge to its current value"""
+        with self._lock:
+            self._gauges[name] = value
+
+    def observe(self, name, value):
+        """Record one observation (a duration in seconds, a batch size, ...) in a summary"""
+        with self._lock:
+            summary = self._summaries.get(name)
+            if summary is None:
+                self._summaries[name] = [1, value, value]
+            else:
+                summary[0] += 1
+                summary[1] += value
+                if value > summary[2]:
+                    summary[2] = value
+
+    @contextmanager
+    def timer(self, name):
+        """Time a with-block into the summary `name`"""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start)
+
+    def track_cache(self, name, cache):
+        """
+        Report a cache's hit/miss statistics in every snapshot
+
+        Args:
+            name (str): Metric prefix, e.g. 'prediction_cache'
+            cache: Object with a stats() method returning a dict of numbers
+        """
+        with self._lock:
+            self._caches[name] = cache
+
+    def snapshot(self):
+        """
+        Copy the current values
+
+        Returns:
+            dict: 'counters', 'gauges' and 'summaries' (count/sum/max per name)
+        """
+        with self._lock:
+            gauges = dict(self._gauges)
+            caches = dict(self._caches)
+            snapshot = {
+                'counters': dict(self._counters),
+                'gauges': gauges,
+                'summaries': {
+                    name: {'count': count, 'sum': total, 'max': peak}
+                    for name, (count, total, peak) in self._summaries.items()
+                },
+            }
+        for prefix, cache in caches.items():
+            for key, value in cache.stats().items():
+                gauges[f"{prefix}.{key}"] = value
+        return snapshot
+
+    def reset(self):
+        """Clear all recorded values (tracked caches stay registered)"""
+        with self._lock:
+            self._counters.clear()
+            self._gauges.clear()
+            self._summaries.clear()
+
+    def flush(self):
+        """Send a snapshot to every sink"""
+        snapshot = self.snapshot()
+        for sink in self.sinks:
+            sink.emit(snapshot)
+
+
+def to_prometheus(snapshot, prefix='intent'):
+    """
+    Render a snapshot in the Prometheus text exposition format
+
+    Args:
+        snapshot (dict): Output of Metrics.snapshot()
+        prefix (str): Prepended to every metric name
+
+    Returns:
+        str: Exposition text
+    """
+    def metric_name(name):
+        return re.sub(r'[^a-zA-Z0-9_]', '_', f"{prefix}_{name}")
+
+    lines = []
+    for name, value in sorted(snapshot['counters'].items()):
+        name = metric_name(name)
+        lines += [f"# TYPE {name}_total counter", f"{name}_total {value}"]
+    for name, value in sorted(snapshot['gauges'].items()):
+        name = metric_name(name)
+        lines += [f"# TYPE {name} gauge", f"{name} {value}"]
+    for name, summary in sorted(snapshot['summaries'].items()):
+        name = metric_name(name)
+        lines += [
+            f"# TYPE {name} summary",
+            f"{name}_count {summary['count']}",
+            f"{name}_sum {summary['sum']}",
+            f"# TYPE {name}_max gauge",
+            f"{name}_max {summary['max']}",
+        ]
+    return '\n'.join(lines) + '\n'
+
+
+class JsonFileSink:
+    def __init__(self, path):
+        """
+        Write each snapshot to a JSON file, replacing the previous one
+
+        Args:
+            path (str): Output file
+        """
+        self.path = path
+
+    def emit(self, snapshot):
+        _write_atomic(self.path, json.dumps(snapshot, indent=2))
+
+
+class PrometheusFileSink:
+    def __init__(self, path, prefix='intent'):
+        """
+        Write each snapshot as Prometheus text, e.g. for node_exporter's textfile collector
+
+        Args:
+            path (str): Output file (conventionally *.prom)
+            prefix (str): Prepended to every metric name
+        """
+        self.path = path
+        self.prefix = prefix
+
+    def emit(self, snapshot):
+        _write_atomic(self.path, to_prometheus(snapshot, self.prefix))
+
+
+def _write_atomic(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w', encoding='utf-8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
@@ -1,103 +1,928 @@
-import spacy
 import json
+import mmap
 import os
+import pickle
+import random
+import re
+import shutil
+import tempfile
+import threading
+import time
+from itertools import count, islice
+
+from cache import normalize_text
+from data_pipeline import (
+    ensure_prepared, is_dev, iter_examples, iter_prepared, iter_records, read_labels, reservoir_sample
+)
+
+# Every model assigned to a classifier gets a fresh token so caches can
+# tell a retrained or reloaded pipeline apart from the previous one
+_model_tokens = count(1)
+
+# Single-file artifact layout: magic, 8-byte header length, JSON header, nlp bytes
+ARTIFACT_MAGIC = b'INTENTM1'
+
+# Optimizer state saved alongside a model so update_model() can resume from it
+OPTIMIZER_FILE = 'optimizer.pkl'
+# Training data a model was built from, so update_model() can replay it
+CORPUS_FILE = 'corpus.json'
+# Rows from every update_model() call so far, kept with the model for replay
+UPDATES_FILE = 'updates.jsonl'
+_OPTIMIZER_TABLES = ('mom1', 'mom2', 'nr_update', 'last_seen', 'averages')
+
+# Seconds a replaced model directory is kept for readers that resolved it before the swap
+_STALE_DIR_GRACE = 60.0
 
 class IntentClassifier:
-    def __init__(self, model_path='intent_model'):
+    def __init__(self, model_path='intent_model', cache=None, lazy=False,
+                 best_model_path='best_intent_model', metrics=None, registry=None):
         """
         Initialize the intent classifier
         
         Args:
-            model_path (str): Path to save/load the trained model
+            model_path (str): Path to save/load the trained model, either a
+                spaCy model directory or a single-file artifact
+            cache (PredictionCache): Optional cache consulted before the model
+            lazy (bool): Defer loading an existing model until the first prediction
+            best_model_path (str): Path the best dev-scoring checkpoint is saved to
+            metrics (Metrics): Optional recorder for stage timings, batch sizes,
+                cache hit rates and load times
+            registry (ModelRegistry): Optional registry that trained models are
+                published to and loaded from instead of model_path
         """
         self.model_path = model_path
+        self.best_model_path = best_model_path
+        self.cache = cache
+        self.lazy = lazy
+        self.metrics = metrics
+        if metrics is not None and cache is not None:
+            metrics.track_cache('prediction_cache', cache)
+        self.registry = registry
+        self.model_version = None
+        self._watcher = None
+        self.model_token = None
         self.nlp = None
     
-    def train_model(self, train_data_path, force_retrain=False):
+    @property
+    def nlp(self):
+        return self._nlp
+    
+    @nlp.setter
+    def nlp(self, nlp):
+        self._nlp = nlp
+        self.model_token = next(_model_tokens) if nlp is not None else None
+        if self.cache is not None:
+            self.cache.bind(self.model_token)
+    
+    def train_model(self, train_data_path, force_retrain=False, max_epochs=10,
+                    batch_start=4.0, batch_stop=32.0, batch_compound=1.001,
+                    dev_split=0.2, patience=3, dropout=0.1, shuffle_buffer=10000,
+                    seed=0, textcat_config=None):
         """
         Train the model if not already trained
         
+        The training data is prepared once into a validated, deduplicated JSONL
+        corpus (see data_pipeline) and streamed from disk every epoch through
+        a bounded shuffle buffer, updating on compounding minibatches. When a
+        dev split is held out it is scored every epoch; the best macro-F1
+        checkpoint is saved to best_model_path and training stops once it has
+        not improved for `patience` epochs.
+        
         Args:
-            train_data_path (str): Path to training data JSON
+            train_data_path (str): Path to training data (.json, .jsonl or
+                .prepared.jsonl)
             force_retrain (bool): Force retraining even if model exists
+            max_epochs (int): Maximum number of passes over the training data
+            batch_start (float): Minibatch size for the first update
+            batch_stop (float): Upper bound the minibatch size compounds to
+            batch_compound (float): Factor the minibatch size grows by per batch
+            dev_split (float): Fraction of examples held out for evaluation
+            patience (int): Epochs without dev improvement before stopping
+            dropout (float): Dropout rate used during updates
+            shuffle_buffer (int): Number of examples held for shuffling
+            seed (int): Seed for shuffling
+            textcat_config (dict): Overrides for the textcat component config,
+                e.g. a different "model" architecture
         """
         # Check if model already exists and we're not force retraining
-        if os.path.exists(self.model_path) and not force_retrain:
+        if self._saved_model_path() is not None and not force_retrain:
+            if self.lazy:
+                print("Model already exists. Deferring load until first prediction.")
+                return
             print("Model already exists. Loading existing model.")
-            self.nlp = spacy.load(self.model_path)
+            self.load_model()
             return
         
-        # Load training data
-        with open(train_data_path, 'r', encoding='utf-8') as f:
-            train_data = json.load(f)
+        import spacy
+        from spacy.util import minibatch
+        from thinc.api import compounding, fix_random_seed
+        
+        fix_random_seed(seed)
+        
+        # Validate and label-complete the corpus once; later retrains reuse it
+        corpus_path = ensure_prepared(train_data_path)
         
         # Create blank English model
         nlp = spacy.blank("en")
-        text_classifier = nlp.add_pipe("textcat")
-        
-        # Collect all categories
-        categories = set()
-        for _, annotations in train_data:
-            categories.update(annotations['cats'].keys())
+        text_classifier = nlp.add_pipe("textcat", config=textcat_config or {})
         
         # Add categories to classifier
-        for category in categories:
+        for category in read_labels(corpus_path):
             text_classifier.add_label(category)
         
-        # Prepare training examples
-        train_examples = []
-        for text, annotations in train_data:
-            doc = nlp.make_doc(text)
-            example = spacy.training.Example.from_dict(
-                doc, 
-                {"cats": annotations['cats']}
-            )
-            train_examples.append(example)
+        # Examples are streamed from disk each epoch; a hashed dev split is
+        # held out for evaluation and early stopping
+        def train_examples(epoch_seed):
+            return iter_examples(nlp, corpus_path, dev_split=dev_split,
+                                 shuffle_buffer=shuffle_buffer, seed=epoch_seed)
+        has_dev = dev_split > 0 and any(is_dev(row['text'], dev_split) for row in iter_prepared(corpus_path))
         
         # Initialize and train
-        optimizer = nlp.begin_training()
-        for _ in range(10):  # 10 epochs
+        optimizer = nlp.initialize(lambda: islice(train_examples(seed), 1000))
+        best_score = None
+        best_weights = None
+        epochs_without_improvement = 0
+        for epoch in range(max_epochs):
             losses = {}
-            nlp.update(train_examples, sgd=optimizer, losses=losses)
+            batches = minibatch(
+                train_examples(seed + epoch),
+                size=compounding(batch_start, batch_stop, batch_compound)
+            )
+            for batch in batches:
+                nlp.update(batch, sgd=optimizer, drop=dropout, losses=losses)
+            
+            if not has_dev:
+                continue
+            
+            score = _dev_macro_f(nlp, corpus_path, dev_split)
+            print(f"Epoch {epoch + 1}: loss {losses.get('textcat', 0.0):.4f}, dev macro-F1 {score:.4f}")
+            if best_score is None or score > best_score:
+                best_score = score
+                best_weights = nlp.to_bytes()
+                epochs_without_improvement = 0
+                _write_dir_atomic(self.best_model_path, nlp.to_disk)
+            else:
+                epochs_without_improvement += 1
+                if epochs_without_improvement >= patience:
+                    print(f"No dev improvement for {patience} epochs. Stopping early.")
+                    break
+        
+        # Keep the best checkpoint rather than the last epoch
+        if best_weights is not None:
+            nlp.from_bytes(best_weights)
+            print(f"Best dev macro-F1 {best_score:.4f} saved to {self.best_model_path}")
+        
+        # Save the trained model, with optimizer state so it can be updated later
+        def save(path):
+            nlp.to_disk(path)
+            _save_optimizer(optimizer, nlp, os.path.join(path, OPTIMIZER_FILE))
+            _save_corpus_record(path, {'train_data': os.path.abspath(train_data_path)})
+        
+        if self.registry is not None:
+            self.model_version = self.registry.publish(
+                nlp,
+                metrics={'dev_macro_f': best_score} if best_score is not None else {},
+                train_data_path=train_data_path,
+                save=save
+            )
+        else:
+            _write_dir_atomic(self.model_path, save)
+            print(f"Model trained and saved to {self.model_path}")
+        
+        self.nlp = nlp
+    
+    def update_model(self, new_data_path, replay_data_path=None, replay_ratio=1.0,
+                     epochs=3, batch_start=4.0, batch_stop=32.0, batch_compound=1.001,
+                     dropout=0.1, seed=0):
+        """
+        Incrementally update the saved model with newly labelled examples
+        
+        Training resumes from the weights (and optimizer state, when saved)
+        at model_path instead of starting from a blank pipeline. A random
+        sample of the original corpus, and of the data from earlier updates,
+        is replayed alongside the new examples to avoid forgetting. The
+        corpus path is recorded next to the model, and update rows are
+        copied into the new model directory, so they can be replayed even
+        after the caller's files are gone. Labels not
+        yet known to the model are added by rebuilding the textcat and
+        copying every trained weight into it, including the existing labels'
+        slices of the label-sized layers; only the new labels start untrained.
         
-        # Save the trained model
-        nlp.to_disk(self.model_path)
-        print(f"Model trained and saved to {self.model_path}")
+        The updated model is published as a new registry version when a
+        registry is attached. Otherwise it is written to a new versioned
+        directory next to model_path (e.g. intent_model-v0003), which becomes
+        the new model_path.
+        
+        Args:
+            new_data_path (str): Newly labelled examples (.json or .jsonl)
+            replay_data_path (str): Original training data to replay from
+                (defaults to the corpus recorded with the saved model)
+            replay_ratio (float): Replayed examples per new example
+            epochs (int): Passes over the new and replayed examples
+            batch_start (float): Minibatch size for the first update
+            batch_stop (float): Upper bound the minibatch size compounds to
+            batch_compound (float): Factor the minibatch size grows by per batch
+            dropout (float): Dropout rate used during updates
+            seed (int): Seed for replay sampling and shuffling
+        
+        Returns:
+            str: Path of the new model version
+        
+        Raises:
+            ValueError: If there is no saved model to update, or no corpus to
+                replay from (pass replay_ratio=0 to train on the new examples alone)
+        """
+        import spacy
+        from spacy.training import Example
+        from spacy.util import minibatch
+        from thinc.api import compounding, fix_random_seed
+        
+        fix_random_seed(seed)
+        rng = random.Random(seed)
+        
+        base_path = self._saved_model_path()
+        if base_path is None:
+            raise ValueError("No saved model to update. Call train_model() first.")
+        nlp = spacy.load(base_path)
+        known_labels = list(nlp.get_pipe("textcat").labels)
+        
+        record = _load_corpus_record(base_path) or {'train_data': None}
+        if replay_data_path is not None:
+            record['train_data'] = os.path.abspath(replay_data_path)
+        if replay_ratio > 0:
+            if record['train_data'] is None:
+                raise ValueError(
+                    f"No training corpus is recorded for {base_path}. Pass replay_data_path, "
+                    "or replay_ratio=0 to update on the new examples alone."
+                )
+            if not os.path.exists(record['train_data']):
+                raise ValueError(
+                    f"Training corpus {record['train_data']} not found. Pass replay_data_path "
+                    "with its new location."
+                )
+        
+        updates_path = os.path.join(base_path, UPDATES_FILE)
+        new_rows = [(text, cats) for _, text, cats in iter_records(new_data_path)]
+        replay_sources = []
+        replay_rows = []
+        if replay_ratio > 0:
+            replay_sources.append(ensure_prepared(record['train_data']))
+            if os.path.exists(updates_path):
+                replay_sources.append(updates_path)
+            rows = (
+                (row['text'], row['cats'])
+                for path in replay_sources
+                for row in iter_prepared(path)
+            )
+            replay_rows = reservoir_sample(rows, int(len(new_rows) * replay_ratio), rng)
+        
+        new_labels = sorted({label for _, cats in new_rows for label in cats} - set(known_labels))
+        labels = known_labels + new_labels
+        
+        def make_example(text, cats):
+            full_cats = {label: bool(cats.get(label, False)) for label in labels}
+            return Example.from_dict(nlp.make_doc(text), {"cats": full_cats})
+        
+        examples = [make_example(text, cats) for text, cats in new_rows + replay_rows]
+        
+        optimizer_path = os.path.join(base_path, OPTIMIZER_FILE)
+        if new_labels:
+            print(f"Adding new labels: {', '.join(new_labels)}")
+            nlp = _with_labels(nlp, labels, lambda: examples)
+            # Remake the examples against the rebuilt pipeline's vocab
+            examples = [make_example(text, cats) for text, cats in new_rows + replay_rows]
+            optimizer = nlp.resume_training()
+        elif os.path.exists(optimizer_path):
+            optimizer = _load_optimizer(nlp, optimizer_path)
+        else:
+            optimizer = nlp.resume_training()
+        
+        for _ in range(epochs):
+            rng.shuffle(examples)
+            losses = {}
+            batches = minibatch(
+                examples,
+                size=compounding(batch_start, batch_stop, batch_compound)
+            )
+            for batch in batches:
+                nlp.update(batch, sgd=optimizer, drop=dropout, losses=losses)
+        
+        def save(path):
+            nlp.to_disk(path)
+            _save_optimizer(optimizer, nlp, os.path.join(path, OPTIMIZER_FILE))
+            _save_corpus_record(path, record)
+            _save_update_rows(os.path.join(path, UPDATES_FILE), updates_path, new_rows)
+        
+        print(f"Model updated with {len(new_rows)} new and {len(replay_rows)} replayed examples")
+        if self.registry is not None:
+            self.model_version = self.registry.publish(
+                nlp,
+                train_data_path=new_data_path,
+                extra={'new_labels': new_labels, 'replay_data': replay_sources},
+                save=save
+            )
+            version_path = self.registry.path(self.model_version)
+        else:
+            # Written to a temporary directory first so a version is never seen half-written
+            version_path = _next_version_path(base_path)
+            _write_dir_atomic(version_path, save)
+            print(f"Saved to {version_path}")
+            self.model_path = version_path
         
         self.nlp = nlp
+        return version_path
+    
+    def load_model(self, path=None):
+        """
+        Load a trained model from a directory or a single-file artifact
+        
+        Args:
+            path (str): Model location (defaults to the registry's current
+                version, or model_path)
+        """
+        version = None
+        if path is None:
+            # Read the current version once, so a concurrent publish can't make
+            # the loaded model and the recorded version disagree
+            if self.registry is not None:
+                version = self.registry.current()
+            path = self.registry.path(version) if version is not None else self.model_path
+        self.nlp = self._read_model(path)
+        self.model_version = version
+    
+    def _read_model(self, path):
+        """Load a pipeline from a directory or artifact without installing it"""
+        import spacy
+        
+        start = time.perf_counter()
+        # Resolve a symlinked model directory once so a concurrent save can't mix versions
+        path = os.path.realpath(path)
+        if os.path.isfile(path):
+            nlp = self._load_artifact(path)
+        else:
+            nlp = spacy.load(path)
+        if self.metrics is not None:
+            self.metrics.observe('model.load_seconds', time.perf_counter() - start)
+        return nlp
+    
+    def _saved_model_path(self):
+        """Location of the model to load, or None if none has been saved"""
+        if self.registry is not None and self.registry.current() is not None:
+            return self.registry.path()
+        return self.model_path if os.path.exists(self.model_path) else None
+    
+    def refresh_from_registry(self):
+        """
+        Swap in the registry's current version if it differs from the loaded one
+        
+        The new pipeline is loaded and warmed up while the old one keeps
+        serving, then installed with a single reference swap. Batches already
+        running finish on the pipeline they started with.
+        
+        Returns:
+            bool: True if a new version was installed
+        """
+        version = self.registry.current()
+        if version is None or version == self.model_version:
+            return False
+        
+        nlp = self._read_model(self.registry.path(version))
+        # Run one text through so lazily allocated state is ready before serving
+        list(nlp.pipe(["warm up"]))
+        self.nlp = nlp
+        self.model_version = version
+        print(f"Switched to model {version}")
+        return True
+    
+    def watch_registry(self, interval=5.0):
+        """
+        Poll the registry in a background thread and hot-swap new versions
+        
+        Args:
+            interval (float): Seconds between checks
+        """
+        if self.registry is None:
+            raise ValueError("No registry attached to watch.")
+        if self._watcher is not None:
+            return
+        
+        stop = threading.Event()
+        
+        def watch():
+            while not stop.wait(interval):
+                try:
+                    self.refresh_from_registry()
+                except Exception as error:
+                    # Keep serving the current model if a version fails to load
+                    print(f"Model refresh failed: {error}")
+        
+        thread = threading.Thread(target=watch, name='model-registry-watcher', daemon=True)
+        thread.start()
+        self._watcher = (thread, stop)
+    
+    def stop_watching(self):
+        """Stop the background registry watcher"""
+        if self._watcher is not None:
+            thread, stop = self._watcher
+            stop.set()
+            thread.join()
+            self._watcher = None
+    
+    def export_model(self, artifact_path):
+        """
+        Write the loaded pipeline to a single-file artifact
+        
+        The artifact holds the pipeline config and its serialized weights, so
+        workers can load it with load_model() straight from a memory map.
+        
+        Args:
+            artifact_path (str): File to write
+        """
+        self._ensure_loaded()
+        header = json.dumps({'config': self.nlp.config.to_str()}).encode('utf-8')
+        
+        tmp_path = f"{artifact_path}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(ARTIFACT_MAGIC)
+            f.write(len(header).to_bytes(8, 'big'))
+            f.write(header)
+            f.write(self.nlp.to_bytes())
+        os.replace(tmp_path, artifact_path)
+        print(f"Model exported to {artifact_path}")
+    
+    @staticmethod
+    def _load_artifact(artifact_path):
+        """
+        Build a pipeline from a single-file artifact via a read-only memory map
+        
+        Args:
+            artifact_path (str): Artifact written by export_model()
+        
+        Returns:
+            Language: Loaded pipeline
+        """
+        from spacy.util import get_lang_class
+        from thinc.api import Config
+        
+        with open(artifact_path, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                if mapped[:len(ARTIFACT_MAGIC)] != ARTIFACT_MAGIC:
+                    raise ValueError(f"{artifact_path} is not an intent model artifact.")
+                offset = len(ARTIFACT_MAGIC)
+                header_length = int.from_bytes(mapped[offset:offset + 8], 'big')
+                offset += 8
+                header = json.loads(mapped[offset:offset + header_length])
+                offset += header_length
+                
+                config = Config().from_str(header['config'])
+                nlp = get_lang_class(config['nlp']['lang']).from_config(config)
+                with memoryview(mapped) as view:
+                    nlp.from_bytes(view[offset:])
+        return nlp
+    
+    def _ensure_loaded(self):
+        """Load a lazily deferred model, or fail if there is nothing to load"""
+        if self.nlp is None:
+            if self.lazy and self._saved_model_path() is not None:
+                self.load_model()
+            else:
+                raise ValueError("Model not trained. Call train_model() first.")
     
-    def predict(self, texts):
+    def predict(self, texts, batch_size=None, n_process=1):
         """
         Predict intent categories for given texts
         
         Args:
             texts (list or str): Text or list of texts to classify
+            batch_size (int): Number of texts to buffer per nlp.pipe batch
+            n_process (int): Number of worker processes (-1 for all cores)
         
         Returns:
             list: Predictions for each text
         """
-        if self.nlp is None:
-            raise ValueError("Model not trained. Call train_model() first.")
-        
         # Ensure texts is a list
         if isinstance(texts, str):
             texts = [texts]
         
-        predictions = []
-        for text in texts:
-            doc = self.nlp(text)
-            # Sort categories by confidence score
-            sorted_cats = sorted(
-                doc.cats.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )
-            predictions.append({
-                'text': text,
-                'categories': dict(sorted_cats)
-            })
+        return list(self.predict_stream(texts, batch_size=batch_size, n_process=n_process))
+    
+    def predict_stream(self, texts, batch_size=None, n_process=1):
+        """
+        Lazily predict intent categories for an iterable of texts
+        
+        Texts are streamed through nlp.pipe, so a generator of any size can
+        be classified with bounded memory. Predictions are yielded in input
+        order as soon as their batch is ready.
+        
+        Args:
+            texts (iterable): Texts to classify
+            batch_size (int): Number of texts to buffer per nlp.pipe batch
+                (defaults to the pipeline's configured batch size)
+            n_process (int): Number of worker processes (-1 for all cores)
+        
+        Returns:
+            generator: Prediction dict for each text
+        """
+        self._ensure_loaded()
+        
+        if self.cache is not None:
+            return self._predict_cached(texts, batch_size, n_process)
+        
+        return self._classify(texts, batch_size, n_process)
+    
+    def _classify(self, texts, batch_size, n_process):
+        """
+        Run texts through the pipeline, timing each stage when metrics are enabled
         
-        return predictions
+        Args:
+            texts (iterable): Texts to classify
+            batch_size (int): Number of texts per nlp.pipe batch
+            n_process (int): Number of worker processes
+        
+        Returns:
+            iterator: Prediction dict for each text
+        """
+        # Hold one pipeline for the whole call so a hot-swap can't split it
+        nlp = self.nlp
+        if self.metrics is None:
+            docs = nlp.pipe(texts, batch_size=batch_size, n_process=n_process)
+            return map(self._to_prediction, docs)
+        if n_process != 1:
+            # Stages run in worker processes and can't be timed individually
+            return self._timed(nlp.pipe(texts, batch_size=batch_size, n_process=n_process))
+        return self._classify_instrumented(nlp, texts, batch_size)
+    
+    def _timed(self, docs):
+        metrics = self.metrics
+        docs = iter(docs)
+        while True:
+            start = time.perf_counter()
+            doc = next(docs, None)
+            if doc is None:
+                return
+            prediction = self._to_prediction(doc)
+            metrics.observe('predict.total_seconds', time.perf_counter() - start)
+            yield prediction
+    
+    def _classify_instrumented(self, nlp, texts, batch_size):
+        """
+        Classify in explicit batches, timing the tokenizer, each pipe and the post-sort
+        
+        Args:
+            nlp (Language): Pipeline to run
+            texts (iterable): Texts to classify
+            batch_size (int): Number of texts per batch
+        
+        Yields:
+            dict: Prediction for each text
+        """
+        metrics = self.metrics
+        batch_size = batch_size or nlp.batch_size
+        texts = iter(texts)
+        while True:
+            batch = list(islice(texts, batch_size))
+            if not batch:
+                return
+            metrics.observe('predict.batch_size', len(batch))
+            metrics.increment('predict.texts', len(batch))
+            
+            with metrics.timer('predict.stage.tokenizer_seconds'):
+                docs = [nlp.make_doc(text) for text in batch]
+            for name, proc in nlp.pipeline:
+                with metrics.timer(f'predict.stage.{name}_seconds'):
+                    docs = list(proc.pipe(docs, batch_size=batch_size))
+            with metrics.timer('predict.stage.postprocess_seconds'):
+                predictions = [self._to_prediction(doc) for doc in docs]
+            yield from predictions
+    
+    def _predict_cached(self, texts, batch_size, n_process):
+        """
+        Serve predictions from the cache, sending only misses through the model
+        
+        Args:
+            texts (iterable): Texts to classify
+            batch_size (int): Number of texts to look up per chunk
+            n_process (int): Number of worker processes for the misses
+        
+        Yields:
+            dict: Prediction for each text, in input order
+        """
+        chunk_size = batch_size or self.nlp.batch_size
+        texts = iter(texts)
+        while True:
+            chunk = list(islice(texts, chunk_size))
+            if not chunk:
+                return
+            
+            # Results from a model swapped out mid-chunk must not enter the cache
+            model_token = self.model_token
+            categories = [self.cache.get(text) for text in chunk]
+            # Repeats of the same query within a chunk only hit the model once
+            pending = {}
+            for i, cats in enumerate(categories):
+                if cats is None:
+                    pending.setdefault(normalize_text(chunk[i]), []).append(i)
+            if pending:
+                firsts = [indices[0] for indices in pending.values()]
+                predictions = self._classify(
+                    (chunk[i] for i in firsts),
+                    batch_size,
+                    # Forking workers only pays off for a large share of misses
+                    n_process if len(firsts) >= chunk_size // 2 else 1
+                )
+                for indices, prediction in zip(pending.values(), predictions):
+                    cats = prediction['categories']
+                    self.cache.put(chunk[indices[0]], cats, model_token=model_token)
+                    for i in indices:
+                        categories[i] = cats
+            
+            for text, cats in zip(chunk, categories):
+                yield {
+                    'text': text,
+                    'categories': dict(cats)
+                }
+    
+    @staticmethod
+    def _to_prediction(doc):
+        """
+        Build a prediction dict from a processed doc
+        
+        Args:
+            doc (Doc): Doc that has been run through the textcat pipe
+        
+        Returns:
+            dict: Text and categories sorted by confidence
+        """
+        # Sort categories by confidence score
+        sorted_cats = sorted(
+            doc.cats.items(), 
+            key=lambda x: x[1], 
+            reverse=True
+        )
+        return {
+            'text': doc.text,
+            'categories': dict(sorted_cats)
+        }
+
+def _dev_macro_f(nlp, corpus_path, dev_split, batch_size=256):
+    """
+    Score the dev split of a prepared corpus without holding it in memory
+    
+    Dev rows are streamed through nlp.pipe and only per-label counts are
+    kept, giving the same macro-F1 as nlp.evaluate() for an exclusive
+    textcat (which would first load every dev example into a list).
+    
+    Args:
+        nlp (Language): Pipeline being trained
+        corpus_path (str): Prepared JSONL corpus
+        dev_split (float): Fraction of texts held out as dev
+        batch_size (int): Texts per nlp.pipe batch
+    
+    Returns:
+        float: Macro-averaged F1 over the textcat labels
+    """
+    from spacy.scorer import PRFScore
+    
+    labels = nlp.get_pipe("textcat").labels
+    per_label = {label: PRFScore() for label in labels}
+    rows = (
+        (row['text'], row['cats'])
+        for row in iter_prepared(corpus_path)
+        if is_dev(row['text'], dev_split)
+    )
+    for doc, gold_cats in nlp.pipe(rows, as_tuples=True, batch_size=batch_size):
+        pred_label = max(doc.cats, key=doc.cats.get)
+        gold_label = max(gold_cats, key=gold_cats.get)
+        if pred_label == gold_label:
+            per_label[pred_label].tp += 1
+        else:
+            per_label[gold_label].fn += 1
+            per_label[pred_label].fp += 1
+    return sum(prf.fscore for prf in per_label.values()) / len(per_label) if per_label else 0.0
+
+
+def _save_corpus_record(model_dir, record):
+    """
+    Record the data a model was trained on inside its directory
+    
+    Args:
+        model_dir (str): Model directory being written
+        record (dict): 'train_data', the absolute path of the original corpus
+    """
+    with open(os.path.join(model_dir, CORPUS_FILE), 'w', encoding='utf-8') as f:
+        json.dump(record, f, indent=2)
+
+
+def _save_update_rows(path, previous_path, rows):
+    """
+    Write the update rows of a model: its parent's rows followed by the new ones
+    
+    Args:
+        path (str): UPDATES_FILE of the model being written
+        previous_path (str): UPDATES_FILE of the model it was updated from
+        rows (list): New (text, cats) pairs
+    """
+    if os.path.exists(previous_path):
+        shutil.copyfile(previous_path, path)
+    with open(path, 'a', encoding='utf-8') as f:
+        for text, cats in rows:
+            f.write(json.dumps({'text': text, 'cats': cats}) + '\n')
+
+
+def _load_corpus_record(model_dir):
+    """Read a record written by _save_corpus_record(), or None if there is none"""
+    path = os.path.join(model_dir, CORPUS_FILE)
+    if not os.path.exists(path):
+        return None
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _save_optimizer(optimizer, nlp, path):
+    """
+    Pickle an optimizer with its state keyed by layer position, not node id
+    
+    Thinc keys optimizer state on model node ids, which differ between
+    processes, so they are translated to positions in the textcat model.
+    
+    Args:
+        optimizer (Optimizer): Optimizer used to train nlp
+        nlp (Language): Trained pipeline
+        path (str): File to write
+    """
+    positions = {node.id: i for i, node in enumerate(nlp.get_pipe("textcat").model.walk())}
+    originals = {}
+    try:
+        for name in _OPTIMIZER_TABLES:
+            table = getattr(optimizer, name, None)
+            if table is None:
+                continue
+            originals[name] = table
+            setattr(optimizer, name, {
+                (positions[node_id], param): value
+                for (node_id, param), value in table.items()
+                if node_id in positions
+            })
+        with open(path, 'wb') as f:
+            pickle.dump(optimizer, f)
+    finally:
+        for name, table in originals.items():
+            setattr(optimizer, name, table)
+
+
+def _load_optimizer(nlp, path):
+    """
+    Load an optimizer saved by _save_optimizer() and rebind it to nlp
+    
+    Args:
+        nlp (Language): Pipeline loaded from the same model directory
+        path (str): File written by _save_optimizer()
+    
+    Returns:
+        Optimizer: Optimizer with its state keyed on nlp's node ids
+    """
+    from collections import defaultdict
+    
+    with open(path, 'rb') as f:
+        optimizer = pickle.load(f)
+    node_ids = [node.id for node in nlp.get_pipe("textcat").model.walk()]
+    for name in _OPTIMIZER_TABLES:
+        table = getattr(optimizer, name, None)
+        if table is None:
+            continue
+        rebound = {(node_ids[position], param): value for (position, param), value in table.items()}
+        # nr_update is a defaultdict(int); keep each table's original behaviour
+        setattr(optimizer, name, defaultdict(int, rebound) if name == 'nr_update' else rebound)
+    return optimizer
+
+
+def _with_labels(nlp, labels, get_examples):
+    """
+    Rebuild a pipeline's textcat with a larger label set, keeping shared weights
+    
+    Args:
+        nlp (Language): Trained pipeline
+        labels (list): Full label set, existing labels first
+        get_examples (callable): Returns examples to initialize the new textcat
+    
+    Returns:
+        Language: New pipeline with the extended label set
+    """
+    from spacy.util import get_lang_class
+    
+    new_nlp = get_lang_class(nlp.lang).from_config(nlp.config)
+    text_classifier = new_nlp.get_pipe("textcat")
+    for label in labels:
+        text_classifier.add_label(label)
+    new_nlp.initialize(get_examples)
+    
+    old_model = nlp.get_pipe("textcat").model
+    n_old = len(nlp.get_pipe("textcat").labels)
+    for old_node, new_node in zip(old_model.walk(), text_classifier.model.walk()):
+        for param in old_node.param_names:
+            if not (old_node.has_param(param) and new_node.has_param(param)):
+                continue
+            weights = old_node.get_param(param)
+            new_weights = new_node.get_param(param).copy()
+            if weights.shape == new_weights.shape:
+                new_weights = weights.copy()
+            else:
+                _copy_label_slices(old_node, param, weights, new_weights, n_old)
+            new_node.set_param(param, new_weights)
+    return new_nlp
+
+
+def _copy_label_slices(node, param, weights, new_weights, n_old):
+    """
+    Copy the existing labels' part of a label-sized parameter into its enlarged copy
+    
+    The new labels' slots keep their initial values.
+    
+    Args:
+        node (Model): Layer the parameter belongs to in the old model
+        param (str): Parameter name
+        weights (array): Old parameter, sized for n_old labels
+        new_weights (array): Freshly initialized parameter for the larger label set
+        n_old (int): Number of labels in the old model
+    """
+    if node.name == 'sparse_linear' and param == 'W':
+        if node.attrs.get('v1_indexing'):
+            # v1 indexing reads weights[bucket + label], so the old prefix lines up
+            new_weights[:weights.size] = weights
+        else:
+            # Laid out as (labels, length)
+            length = node.get_dim('length')
+            new_weights.reshape(-1, length)[:n_old] = weights.reshape(n_old, length)
+    elif weights.ndim == 1:
+        new_weights[:n_old] = weights
+    elif weights.shape[1] == new_weights.shape[1]:
+        new_weights[:n_old] = weights
+    else:
+        # The ensemble's output layer reads the linear model's per-label scores
+        # first, then the fixed-width tok2vec features
+        grown = new_weights.shape[1] - weights.shape[1]
+        new_weights[:n_old, :n_old] = weights[:, :n_old]
+        new_weights[:n_old, n_old + grown:] = weights[:, n_old:]
+
+
+def _write_dir_atomic(path, write):
+    """
+    Write a directory in full, then switch path over to it in one step
+    
+    path is a symlink to a hidden sibling (.name.data-XXXX). The new
+    directory is written next to it and a fresh symlink is renamed over
+    path, so path always names a complete directory. Readers that open
+    several files should resolve path once with os.path.realpath().
+    Replaced targets are kept for readers still using them: the previous
+    one always, older ones until they are _STALE_DIR_GRACE seconds old.
+    A plain directory left at path by older versions is moved
+    aside first, which is the only time path briefly does not exist.
+    
+    Args:
+        path (str): Final directory
+        write (callable): Called with the new directory to fill
+    """
+    parent = os.path.dirname(os.path.abspath(path))
+    prefix = f".{os.path.basename(os.path.normpath(path))}.data-"
+    new_path = tempfile.mkdtemp(prefix=prefix, dir=parent)
+    try:
+        write(new_path)
+    except BaseException:
+        shutil.rmtree(new_path, ignore_errors=True)
+        raise
+    
+    previous = os.path.realpath(path) if os.path.islink(path) else None
+    if os.path.isdir(path) and not os.path.islink(path):
+        previous = f"{new_path}.old"
+        os.rename(path, previous)
+    
+    link_path = f"{new_path}.link"
+    os.symlink(os.path.basename(new_path), link_path)
+    os.replace(link_path, path)
+    
+    cutoff = time.time() - _STALE_DIR_GRACE
+    for name in os.listdir(parent):
+        stale = os.path.join(parent, name)
+        if (name.startswith(prefix) and stale not in (new_path, previous)
+                and not os.path.islink(stale) and os.path.getmtime(stale) < cutoff):
+            shutil.rmtree(stale, ignore_errors=True)
+
+
+def _next_version_path(model_path):
+    """
+    Pick the next unused versioned directory name for a model
+    
+    Args:
+        model_path (str): Current model path, versioned or not
+    
+    Returns:
+        str: Path like intent_model-v0002
+    """
+    base = re.sub(r'-v\d+$', '', os.path.normpath(model_path))
+    parent = os.path.dirname(os.path.abspath(base))
+    pattern = re.compile(re.escape(os.path.basename(base)) + r'-v(\d+)$')
+    versions = [int(m.group(1)) for m in map(pattern.match, os.listdir(parent)) if m]
+    return f"{base}-v{max(versions, default=0) + 1:04d}"
 
 # Example usage
 def main():
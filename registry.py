@@ -0,0 +1,182 @@
+import hashlib
+import json
+import os
+import re
+import shutil
+import tempfile
+import time
+
+METADATA_FILE = 'registry.json'
+_CURRENT_FILE = 'CURRENT'
+_VERSION = re.compile(r'^v(\d+)$')
+
+
+def file_sha256(path):
+    """
+    Hash a file in chunks
+
+    Args:
+        path (str): File to hash
+
+    Returns:
+        str: Hex SHA-256 digest
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ModelRegistry:
+    def __init__(self, root='models'):
+        """
+        Versioned store of trained pipelines with a movable CURRENT pointer
+
+        Each version lives in root/vNNNN next to a registry.json holding its
+        metadata. Versions are written to a temporary directory and renamed
+        into place, and CURRENT is replaced atomically, so readers never see
+        a partially written model.
+
+        Args:
+            root (str): Registry directory
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def publish(self, nlp, labels=None, metrics=None, train_data_path=None, extra=None,
+                make_current=True, save=None):
+        """
+        Save a pipeline as a new version
+
+        Args:
+            nlp (Language): Trained pipeline
+            labels (list): Labels it predicts (read from its textcat if omitted)
+            metrics (dict): Evaluation results to record
+            train_data_path (str): Training data, hashed into the metadata
+            extra (dict): Any further metadata (e.g. the parent version)
+            make_current (bool): Point CURRENT at the new version
+            save (callable): Writes the model into a directory (defaults to
+                nlp.to_disk); use it to store extra files such as optimizer state
+
+        Returns:
+            str: The new version name, e.g. 'v0003'
+        """
+        metadata = {
+            'labels': list(labels if labels is not None else nlp.get_pipe("textcat").labels),
+            'metrics': metrics or {},
+            'train_data': os.path.basename(train_data_path) if train_data_path else None,
+            'train_data_path': os.path.abspath(train_data_path) if train_data_path else None,
+            'train_data_sha256': file_sha256(train_data_path) if train_data_path else None,
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            **(extra or {}),
+        }
+
+        tmp_dir = tempfile.mkdtemp(prefix='.publish-', dir=self.root)
+        try:
+            (save or nlp.to_disk)(tmp_dir)
+            return self._commit(tmp_dir, metadata, make_current)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def publish_directory(self, model_dir, make_current=True, **metadata):
+        """
+        Copy an already saved model directory in as a new version
+
+        Args:
+            model_dir (str): Saved spaCy model directory
+            make_current (bool): Point CURRENT at the new version
+            **metadata: Metadata to record
+
+        Returns:
+            str: The new version name
+        """
+        tmp_dir = tempfile.mkdtemp(prefix='.publish-', dir=self.root)
+        try:
+            shutil.copytree(model_dir, tmp_dir, dirs_exist_ok=True)
+            return self._commit(tmp_dir, metadata, make_current)
+        except BaseException:
+            shutil.rmtree(tmp_dir, ignore_errors=True)
+            raise
+
+    def versions(self):
+        """
+        List published versions, oldest first
+
+        Returns:
+            list: Version names
+        """
+        found = [(int(m.group(1)), name) for name in os.listdir(self.root) if (m := _VERSION.match(name))]
+        return [name for _, name in sorted(found)]
+
+    def current(self):
+        """
+        Name of the version CURRENT points at
+
+        Returns:
+            str or None: Version name, or None if nothing has been published
+        """
+        try:
+            with open(os.path.join(self.root, _CURRENT_FILE), 'r', encoding='utf-8') as f:
+                return f.read().strip() or None
+        except FileNotFoundError:
+            return None
+
+    def path(self, version=None):
+        """
+        Directory of a version
+
+        Args:
+            version (str): Version name (defaults to the current one)
+
+        Returns:
+            str: Model directory
+
+        Raises:
+            ValueError: If there is no such version
+        """
+        version = version or self.current()
+        if version is None or not os.path.isdir(os.path.join(self.root, version)):
+            raise ValueError(f"No model version {version!r} in registry {self.root}")
+        return os.path.join(self.root, version)
+
+    def metadata(self, version=None):
+        """Metadata recorded for a version (defaults to the current one)"""
+        with open(os.path.join(self.path(version), METADATA_FILE), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    def promote(self, version):
+        """
+        Point CURRENT at an existing version, e.g. to roll back
+
+        Args:
+            version (str): Version name
+        """
+        self.path(version)
+        tmp_path = os.path.join(self.root, f".{_CURRENT_FILE}.tmp")
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(version)
+        os.replace(tmp_path, os.path.join(self.root, _CURRENT_FILE))
+
+    def _commit(self, tmp_dir, metadata, make_current):
+        metadata = {'previous': self.current(), **metadata}
+        with open(os.path.join(tmp_dir, METADATA_FILE), 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+
+        # Retry if a concurrent publisher took the same version number
+        while True:
+            existing = self.versions()
+            number = int(existing[-1][1:]) + 1 if existing else 1
+            version = f"v{number:04d}"
+            try:
+                os.rename(tmp_dir, os.path.join(self.root, version))
+                break
+            except OSError:
+                if not os.path.exists(os.path.join(self.root, version)):
+                    raise
+
+        if make_current:
+            self.promote(version)
+        print(f"Published model {version} to {self.root}")
+        return version
@@ -0,0 +1,338 @@
+import argparse
+import asyncio
+import json
+from concurrent.futures import ThreadPoolExecutor
+
+from metrics import Metrics, to_prometheus
+from model import IntentClassifier
+
+
+class RequestTooLarge(Exception):
+    """A request that could never be served, whatever the load (HTTP 413)"""
+
+
+class MicroBatcher:
+    def __init__(self, classifier, max_batch_size=32, max_latency=0.005, max_queue_size=1024):
+        """
+        Collect concurrent prediction requests into micro-batches
+
+        Args:
+            classifier (IntentClassifier): Loaded classifier used for predictions
+            max_batch_size (int): Maximum number of texts per batch
+            max_latency (float): Seconds to wait for a batch to fill up after
+                its first text arrives
+            max_queue_size (int): Maximum number of pending texts before new
+                requests are rejected
+        """
+        self.classifier = classifier
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.queue = asyncio.Queue(maxsize=max_queue_size)
+        # A single worker thread keeps the model off the event loop while
+        # guaranteeing batches never run concurrently against one nlp object
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._task = None
+
+    def start(self):
+        """Start the background batching loop"""
+        if self._task is None:
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop the batching loop and release the worker thread"""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        self._executor.shutdown(wait=True)
+
+    async def predict(self, texts):
+        """
+        Queue texts for classification and wait for their predictions
+
+        Args:
+            texts (list): Texts to classify
+
+        Returns:
+            list: Predictions for each text
+
+        Raises:
+            RequestTooLarge: If there are more texts than the queue can ever hold
+            asyncio.QueueFull: If the queue cannot take all texts right now
+        """
+        if self.queue.maxsize and len(texts) > self.queue.maxsize:
+            raise RequestTooLarge(f"At most {self.queue.maxsize} texts can be sent in one request")
+        if self.queue.maxsize and self.queue.qsize() + len(texts) > self.queue.maxsize:
+            if self.classifier.metrics is not None:
+                self.classifier.metrics.increment('server.rejected_texts', len(texts))
+            raise asyncio.QueueFull()
+
+        loop = asyncio.get_running_loop()
+        futures = []
+        for text in texts:
+            future = loop.create_future()
+            self.queue.put_nowait((text, future))
+            futures.append(future)
+        metrics = self.classifier.metrics
+        if metrics is not None:
+            metrics.gauge('server.queue_depth', self.queue.qsize())
+        return await asyncio.gather(*futures)
+
+    async def _collect_batch(self):
+        """Wait for one text, then gather more until the batch is full or the deadline passes"""
+        batch = [await self.queue.get()]
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + self.max_latency
+        while len(batch) < self.max_batch_size:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+        return batch
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            batch = await self._collect_batch()
+            # Skip texts whose callers have already gone away
+            batch = [(text, future) for text, future in batch if not future.done()]
+            if not batch:
+                continue
+
+            texts = [text for text, _ in batch]
+            metrics = self.classifier.metrics
+            if metrics is not None:
+                metrics.observe('server.batch_size', len(texts))
+                metrics.gauge('server.queue_depth', self.queue.qsize())
+            try:
+                predictions = await loop.run_in_executor(
+                    self._executor,
+                    lambda: self.classifier.predict(texts, batch_size=len(texts))
+                )
+            except Exception as error:
+                for _, future in batch:
+                    if not future.done():
+                        future.set_exception(error)
+                continue
+
+            for (_, future), prediction in zip(batch, predictions):
+                if not future.done():
+                    future.set_result(prediction)
+
+
+class IntentServer:
+    def __init__(self, classifier, host='127.0.0.1', port=8000, max_body_size=1 << 20,
+                 **batcher_options):
+        """
+        Minimal HTTP server that shares one warm classifier between clients
+
+        Endpoints:
+            POST /predict  body {"text": "..."} or {"texts": ["...", ...]}
+            GET  /health
+            GET  /metrics  Prometheus text, when the classifier has metrics enabled
+
+        Args:
+            classifier (IntentClassifier): Loaded classifier used for predictions
+            host (str): Interface to bind to
+            port (int): Port to listen on
+            max_body_size (int): Largest request body accepted, in bytes
+            **batcher_options: Passed through to MicroBatcher
+        """
+        self.classifier = classifier
+        self.host = host
+        self.port = port
+        self.max_body_size = max_body_size
+        self.batcher_options = batcher_options
+        self.batcher = None
+        self._server = None
+
+    async def start(self):
+        """Start the batching loop and begin accepting connections"""
+        self.batcher = MicroBatcher(self.classifier, **self.batcher_options)
+        self.batcher.start()
+        self._server = await asyncio.start_server(self._handle_connection, self.host, self.port)
+        # Port 0 binds a free port; report the one actually in use
+        self.port = self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        """Stop accepting connections and shut down the batching loop"""
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        if self.batcher is not None:
+            await self.batcher.stop()
+            self.batcher = None
+
+    async def serve_forever(self):
+        """Run the server until cancelled"""
+        await self.start()
+        print(f"Serving intent predictions on http://{self.host}:{self.port}")
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    request = await self._read_request(reader, self.max_body_size)
+                except ValueError as error:
+                    await self._write_response(writer, 400, {'error': str(error)}, keep_alive=False)
+                    break
+                except RequestTooLarge as error:
+                    # The unread body is still in the stream, so the connection can't be reused
+                    await self._write_response(writer, 413, {'error': str(error)}, keep_alive=False)
+                    break
+                if request is None:
+                    break
+                method, path, headers, body = request
+                status, payload = await self._dispatch(method, path, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self._write_response(writer, status, payload, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader, max_body_size):
+        """
+        Read one HTTP request
+
+        Args:
+            reader (StreamReader): Client stream
+            max_body_size (int): Largest body accepted, in bytes
+
+        Returns:
+            tuple or None: (method, path, headers, body), or None once the client is done
+
+        Raises:
+            ValueError: If the request line or Content-Length is malformed
+            RequestTooLarge: If Content-Length exceeds max_body_size
+        """
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        parts = request_line.decode('latin-1').split(' ', 2)
+        if len(parts) != 3:
+            raise ValueError('Malformed request line')
+        method, path, _ = parts
+
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.decode('latin-1').partition(':')
+            headers[name.strip().lower()] = value.strip()
+
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise ValueError('Content-Length must be an integer') from None
+        if length < 0:
+            raise ValueError('Content-Length must not be negative')
+        if length > max_body_size:
+            raise RequestTooLarge(f"Request body is limited to {max_body_size} bytes")
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), path, headers, body
+
+    async def _dispatch(self, method, path, body):
+        if path == '/health' and method == 'GET':
+            return 200, {'status': 'ok', 'queued': self.batcher.queue.qsize()}
+        if path == '/metrics' and method == 'GET' and self.classifier.metrics is not None:
+            return 200, to_prometheus(self.classifier.metrics.snapshot())
+        if path != '/predict':
+            return 404, {'error': 'Not found'}
+        if method != 'POST':
+            return 405, {'error': 'Method not allowed'}
+
+        try:
+            data = json.loads(body or b'{}')
+        except ValueError:
+            return 400, {'error': 'Request body must be JSON'}
+        if not isinstance(data, dict):
+            return 400, {'error': 'Request body must be a JSON object'}
+
+        single = 'text' in data
+        texts = [data['text']] if single else data.get('texts')
+        if not isinstance(texts, list) or not all(isinstance(t, str) for t in texts):
+            return 400, {'error': 'Expected "text" string or "texts" list of strings'}
+
+        try:
+            predictions = await self.batcher.predict(texts)
+        except RequestTooLarge as error:
+            return 413, {'error': str(error)}
+        except asyncio.QueueFull:
+            return 503, {'error': 'Server busy, retry later'}
+        except Exception as error:
+            print(f"Prediction failed: {error!r}")
+            return 500, {'error': 'Prediction failed'}
+        return 200, predictions[0] if single else {'predictions': predictions}
+
+    @staticmethod
+    async def _write_response(writer, status, payload, keep_alive):
+        reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found',
+                   405: 'Method Not Allowed', 413: 'Payload Too Large', 500: 'Internal Server Error',
+                   503: 'Service Unavailable'}
+        if isinstance(payload, str):
+            body, content_type = payload.encode('utf-8'), 'text/plain; version=0.0.4'
+        else:
+            body, content_type = json.dumps(payload).encode('utf-8'), 'application/json'
+        head = (
+            f"HTTP/1.1 {status} {reasons[status]}\r\n"
+            f"Content-Type: {content_type}\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n"
+            "\r\n"
+        )
+        writer.write(head.encode('latin-1') + body)
+        await writer.drain()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve intent predictions over HTTP")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--model-path', default='intent_model')
+    parser.add_argument('--train-data', default='train_data.json')
+    parser.add_argument('--max-batch-size', type=int, default=32)
+    parser.add_argument('--max-latency-ms', type=float, default=5.0)
+    parser.add_argument('--max-queue-size', type=int, default=1024)
+    parser.add_argument('--max-body-bytes', type=int, default=1 << 20)
+    parser.add_argument('--metrics', action='store_true', help="Record metrics and serve them at /metrics")
+    args = parser.parse_args()
+
+    # Load the model once; every connection shares it
+    classifier = IntentClassifier(
+        model_path=args.model_path,
+        metrics=Metrics() if args.metrics else None
+    )
+    classifier.train_model(args.train_data)
+
+    server = IntentServer(
+        classifier,
+        host=args.host,
+        port=args.port,
+        max_body_size=args.max_body_bytes,
+        max_batch_size=args.max_batch_size,
+        max_latency=args.max_latency_ms / 1000,
+        max_queue_size=args.max_queue_size,
+    )
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+import json
+import sqlite3
+import threading
+import time
+from collections import OrderedDict, deque
+
+
+class Turn:
+    __slots__ = ('text', 'intent', 'categories', 'timestamp')
+
+    def __init__(self, text, intent, categories, timestamp):
+        """
+        One classified message
+
+        Args:
+            text (str): Message text
+            intent (str): Top intent after context was applied
+            categories (dict): Scores computed when the message was classified
+            timestamp (float): Wall-clock time of the message
+        """
+        self.text = text
+        self.intent = intent
+        self.categories = categories
+        self.timestamp = timestamp
+
+
+class Session:
+    __slots__ = ('user_id', 'turns', 'last_active')
+
+    def __init__(self, user_id, max_turns):
+        self.user_id = user_id
+        self.turns = deque(maxlen=max_turns)
+        self.last_active = time.monotonic()
+
+    @property
+    def last_turn(self):
+        return self.turns[-1] if self.turns else None
+
+
+class SessionStore:
+    def __init__(self, max_sessions=10000, max_turns=5, idle_timeout=1800.0, db_path=None,
+                 flush_interval=1.0, flush_size=512):
+        """
+        Bounded in-memory store of recent turns per user
+
+        Sessions are kept in least-recently-active order. Sessions idle for
+        longer than idle_timeout are evicted, as is the least recently active
+        one when max_sessions is exceeded, so memory stays bounded by
+        max_sessions * max_turns turns.
+
+        Args:
+            max_sessions (int): Maximum number of sessions held in memory
+            max_turns (int): Turns remembered per session
+            idle_timeout (float): Seconds of inactivity before a session is evicted
+            db_path (str): Optional SQLite file every turn is appended to;
+                evicted sessions are restored from it on their next message
+            flush_interval (float): Seconds between background writes of
+                buffered turns; at most this much history is lost on a crash
+            flush_size (int): Buffered turns that wake the writer early
+        """
+        self.max_sessions = max_sessions
+        self.max_turns = max_turns
+        self.idle_timeout = idle_timeout
+        self.flush_size = flush_size
+        self._sessions = OrderedDict()
+        self._lock = threading.Lock()
+        self._db = None
+        # Turns waiting to be written; appending never touches the database, so
+        # conversations don't queue behind each other's commits
+        self._pending = []
+        self._pending_lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._flusher = None
+        if db_path is not None:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            # In WAL mode NORMAL only syncs at checkpoints, not on every commit
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS turns (user_id TEXT NOT NULL, timestamp REAL NOT NULL, "
+                "text TEXT NOT NULL, intent TEXT, categories TEXT NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS turns_user ON turns (user_id, timestamp)")
+            self._db.commit()
+
+            stop = threading.Event()
+
+            def flush_periodically():
+                while not stop.is_set():
+                    self._wake.wait(flush_interval)
+                    self._wake.clear()
+                    try:
+                        self.flush()
+                    except Exception as error:
+                        # Turns stay buffered and are retried on the next flush
+                        print(f"Session flush failed: {error}")
+
+            thread = threading.Thread(target=flush_periodically, name='session-flusher', daemon=True)
+            thread.start()
+            self._flusher = (thread, stop)
+
+    def get(self, user_id):
+        """
+        Return a user's session, restoring it from disk or creating it if needed
+
+        Args:
+            user_id (str): User identifier
+
+        Returns:
+            Session: The user's session, marked as active now
+        """
+        with self._lock:
+            self._evict_idle()
+            session = self._sessions.get(user_id)
+            if session is not None:
+                self._sessions.move_to_end(user_id)
+                session.last_active = time.monotonic()
+                return session
+
+        # Read history without holding the store lock, so other users'
+        # lookups don't wait on the database
+        restored = self._restore(user_id)
+        with self._lock:
+            # Another thread may have restored the same user meanwhile
+            session = self._sessions.setdefault(user_id, restored)
+            self._sessions.move_to_end(user_id)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+            session.last_active = time.monotonic()
+            return session
+
+    def add_turn(self, user_id, text, intent, categories):
+        """
+        Record a classified message for a user
+
+        Args:
+            user_id (str): User identifier
+            text (str): Message text
+            intent (str): Top intent after context was applied
+            categories (dict): Scores for the message
+
+        Returns:
+            Turn: The recorded turn
+        """
+        turn = Turn(text, intent, categories, time.time())
+        self.get(user_id).turns.append(turn)
+        if self._db is not None:
+            with self._pending_lock:
+                self._pending.append((user_id, turn.timestamp, text, intent, json.dumps(categories)))
+                if len(self._pending) >= self.flush_size:
+                    self._wake.set()
+        return turn
+
+    def flush(self):
+        """Write buffered turns to the database in one transaction"""
+        with self._db_lock:
+            with self._pending_lock:
+                rows, self._pending = self._pending, []
+            if not rows or self._db is None:
+                return
+            try:
+                self._db.executemany(
+                    "INSERT INTO turns (user_id, timestamp, text, intent, categories) VALUES (?, ?, ?, ?, ?)",
+                    rows
+                )
+                self._db.commit()
+            except Exception:
+                self._db.rollback()
+                with self._pending_lock:
+                    self._pending[:0] = rows
+                raise
+
+    def end(self, user_id):
+        """Drop a user's session from memory (persisted turns are kept)"""
+        with self._lock:
+            self._sessions.pop(user_id, None)
+
+    def close(self):
+        """Write any buffered turns and close the persistence database"""
+        if self._flusher is not None:
+            thread, stop = self._flusher
+            stop.set()
+            self._wake.set()
+            thread.join()
+            self._flusher = None
+        if self._db is not None:
+            self.flush()
+            with self._db_lock:
+                self._db.close()
+                self._db = None
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_timeout
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.last_active >= cutoff:
+                break
+            del self._sessions[user_id]
+
+    def _restore(self, user_id):
+        session = Session(user_id, self.max_turns)
+        if self._db is not None:
+            # flush() holds the database lock from taking the buffer until it
+            # commits, so under it each turn is either in the table or still
+            # buffered; the buffer is read rather than written on this path
+            with self._db_lock:
+                rows = self._db.execute(
+                    "SELECT timestamp, text, intent, categories FROM turns WHERE user_id = ? "
+                    "ORDER BY timestamp DESC LIMIT ?",
+                    (user_id, self.max_turns)
+                ).fetchall()
+                with self._pending_lock:
+                    rows += [row[1:] for row in self._pending if row[0] == user_id]
+            # The deque keeps only the newest max_turns
+            for timestamp, text, intent, categories in sorted(rows):
+                session.turns.append(Turn(text, intent, json.loads(categories), timestamp))
+        return session
+
+
+class ContextualClassifier:
+    def __init__(self, classifier, store, context_weight=0.5, min_confidence=0.6):
+        """
+        Classify messages using the previous turn of the same conversation
+
+        When a message's own top score is below min_confidence (short
+        follow-ups like "and for hostels?"), its scores are blended with the
+        stored scores of the previous turn. History is never re-run through
+        the model; each turn keeps the scores computed when it arrived.
+
+        Args:
+            classifier (IntentClassifier): Loaded classifier
+            store (SessionStore): Where conversation turns are kept
+            context_weight (float): Weight of the previous turn's scores when blending
+            min_confidence (float): Top score at or above which context is ignored
+        """
+        self.classifier = classifier
+        self.store = store
+        self.context_weight = context_weight
+        self.min_confidence = min_confidence
+
+    def predict(self, user_id, text):
+        """
+        Classify one message in the context of its conversation
+
+        Args:
+            user_id (str): User identifier
+            text (str): Message text
+
+        Returns:
+            dict: Prediction with 'intent' and 'context_used' keys added
+        """
+        return self.predict_batch([(user_id, text)])[0]
+
+    def predict_batch(self, messages, batch_size=None):
+        """
+        Classify messages from many conversations in one model batch
+
+        Args:
+            messages (list): (user_id, text) pairs, in arrival order
+            batch_size (int): Number of texts per nlp.pipe batch
+
+        Returns:
+            list: Prediction for each message
+        """
+        predictions = self.classifier.predict([text for _, text in messages], batch_size=batch_size)
+        for (user_id, text), prediction in zip(messages, predictions):
+            categories = prediction['categories']
+            previous = self.store.get(user_id).last_turn
+            top_score = next(iter(categories.values()), 0.0)
+
+            context_used = previous is not None and top_score < self.min_confidence
+            if context_used:
+                weight = self.context_weight
+                labels = set(categories) | set(previous.categories)
+                blended = {
+                    label: (1 - weight) * categories.get(label, 0.0) + weight * previous.categories.get(label, 0.0)
+                    for label in labels
+                }
+                categories = dict(sorted(blended.items(), key=lambda x: x[1], reverse=True))
+                prediction['categories'] = categories
+
+            intent = next(iter(categories), None)
+            prediction['intent'] = intent
+            prediction['context_used'] = context_used
+            self.store.add_turn(user_id, text, intent, categories)
+        return predictions
@@ -0,0 +1,345 @@
+import argparse
+import json
+import os
+import random
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from data_pipeline import ensure_prepared, iter_prepared
+from model import OPTIMIZER_FILE, IntentClassifier
+
+_ATTRS = ["NORM", "LOWER", "PREFIX", "SUFFIX", "SHAPE"]
+
+# The saved config.cfg architecture is 'base'; the others trade accuracy for cost
+DEFAULT_VARIANTS = [
+    {'name': 'base', 'width': 64, 'depth': 2, 'rows': [2000, 2000, 500, 1000, 500],
+     'ngram_size': 1, 'length': 262144, 'epochs': 10},
+    {'name': 'small', 'width': 32, 'depth': 1, 'rows': [1000, 1000, 250, 500, 250],
+     'ngram_size': 1, 'length': 65536, 'epochs': 10},
+    {'name': 'wide_bigram', 'width': 96, 'depth': 2, 'rows': [4000, 4000, 1000, 2000, 1000],
+     'ngram_size': 2, 'length': 262144, 'epochs': 10},
+    {'name': 'bow_only', 'ngram_size': 2, 'length': 65536, 'epochs': 10},
+]
+
+
+def textcat_config(variant):
+    """
+    Build the textcat component config for a sweep variant
+
+    Variants without a 'width' use the linear bag-of-words model alone.
+
+    Args:
+        variant (dict): Sweep variant
+
+    Returns:
+        dict: Config passed to nlp.add_pipe("textcat", config=...)
+    """
+    linear_model = {
+        "@architectures": "spacy.TextCatBOW.v3",
+        "exclusive_classes": True,
+        "length": variant['length'],
+        "ngram_size": variant['ngram_size'],
+        "no_output_layer": False,
+    }
+    if 'width' not in variant:
+        return {"model": linear_model}
+
+    return {"model": {
+        "@architectures": "spacy.TextCatEnsemble.v2",
+        "linear_model": linear_model,
+        "tok2vec": {
+            "@architectures": "spacy.Tok2Vec.v2",
+            "embed": {
+                "@architectures": "spacy.MultiHashEmbed.v2",
+                "width": variant['width'],
+                "rows": variant['rows'],
+                "attrs": _ATTRS,
+                "include_static_vectors": False,
+            },
+            "encode": {
+                "@architectures": "spacy.MaxoutWindowEncoder.v2",
+                "width": variant['width'],
+                "window_size": 1,
+                "maxout_pieces": 3,
+                "depth": variant['depth'],
+            },
+        },
+    }}
+
+
+def model_size(path):
+    """Size in bytes of a saved model, excluding the optimizer state kept for updates"""
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+        if name != OPTIMIZER_FILE
+    )
+
+
+def write_rows(rows, path):
+    """Write prepared rows as JSONL"""
+    with open(path, 'w', encoding='utf-8') as f:
+        for row in rows:
+            f.write(json.dumps(row) + '\n')
+
+
+def train_variant(variant, corpus_path, model_path, seed=0):
+    """
+    Train one variant on a prepared corpus, without holding out a dev split
+
+    Returns:
+        IntentClassifier: Classifier holding the trained model
+    """
+    classifier = IntentClassifier(
+        model_path=model_path,
+        best_model_path=f"{model_path}-best"
+    )
+    classifier.train_model(
+        corpus_path,
+        force_retrain=True,
+        max_epochs=variant['epochs'],
+        dev_split=0.0,
+        seed=seed,
+        textcat_config=textcat_config(variant)
+    )
+    return classifier
+
+
+def evaluate_variant(variant, rows, folds, seed, work_dir):
+    """
+    Cross-validate one variant
+
+    Runs in a worker process. Each fold trains on the other folds and is
+    scored on its own rows. The first fold's model is kept in work_dir so
+    throughput can be measured once the workers are done.
+
+    Args:
+        variant (dict): Sweep variant
+        rows (list): Prepared corpus rows, already shuffled
+        folds (int): Number of cross-validation folds
+        seed (int): Training seed
+        work_dir (str): Scratch directory for fold corpora and models
+
+    Returns:
+        dict: The variant with accuracy, model size, training time and the
+            path of a trained fold model
+    """
+    correct = total = 0
+    train_seconds = []
+    model_bytes = []
+    kept_model = None
+    for fold in range(folds):
+        held_out = rows[fold::folds]
+        training = [row for i, row in enumerate(rows) if i % folds != fold]
+        if not held_out or not training:
+            continue
+
+        fold_dir = os.path.join(work_dir, f"{variant['name']}-fold{fold}")
+        os.makedirs(fold_dir)
+        corpus_path = os.path.join(fold_dir, 'train.prepared.jsonl')
+        write_rows(training, corpus_path)
+
+        start = time.perf_counter()
+        classifier = train_variant(variant, corpus_path, os.path.join(fold_dir, 'model'), seed)
+        train_seconds.append(time.perf_counter() - start)
+        model_bytes.append(model_size(classifier.model_path))
+
+        predictions = classifier.predict([row['text'] for row in held_out])
+        for row, prediction in zip(held_out, predictions):
+            gold = max(row['cats'], key=row['cats'].get)
+            correct += next(iter(prediction['categories'])) == gold
+            total += 1
+
+        if kept_model is None:
+            kept_model = classifier.model_path
+        else:
+            shutil.rmtree(fold_dir)
+
+    return {
+        **variant,
+        'accuracy': correct / total if total else 0.0,
+        'model_mb': sum(model_bytes) / len(model_bytes) / 1e6,
+        'train_seconds': sum(train_seconds) / len(train_seconds),
+        'model_path': kept_model,
+    }
+
+
+def measure_throughput(model_path, texts, batch_size=64, repeats=3):
+    """
+    Texts per second of a saved model on a fixed text set
+
+    Run in the parent process after the workers have finished, one model
+    at a time, so variants are timed under the same conditions. The best of
+    several runs is kept to damp scheduling noise.
+
+    Args:
+        model_path (str): Saved model
+        texts (list): Texts to classify
+        batch_size (int): Texts per nlp.pipe batch
+        repeats (int): Timed runs
+
+    Returns:
+        float: Texts per second
+    """
+    classifier = IntentClassifier(model_path=model_path)
+    classifier.load_model()
+    classifier.predict(texts[:batch_size], batch_size=batch_size)  # warm up
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        classifier.predict(texts, batch_size=batch_size)
+        best = min(best, time.perf_counter() - start)
+    return len(texts) / best
+
+
+def pareto_front(results):
+    """
+    Keep the results no other result beats on every objective
+
+    Objectives: higher accuracy and throughput, lower model size and training time.
+
+    Args:
+        results (list): Output of evaluate_variant()
+
+    Returns:
+        list: Non-dominated results
+    """
+    def key(result):
+        return (result['accuracy'], result['texts_per_second'],
+                -result['model_mb'], -result['train_seconds'])
+
+    front = []
+    for result in results:
+        dominated = any(
+            all(a >= b for a, b in zip(key(other), key(result))) and key(other) != key(result)
+            for other in results
+        )
+        if not dominated:
+            front.append(result)
+    return front
+
+
+def choose_variant(front, accuracy_tolerance):
+    """
+    Pick the fastest Pareto-front result within accuracy_tolerance of the most accurate
+
+    Args:
+        front (list): Output of pareto_front()
+        accuracy_tolerance (float): Accuracy that may be given up for speed
+
+    Returns:
+        dict: The chosen result
+    """
+    best_accuracy = max(result['accuracy'] for result in front)
+    candidates = [result for result in front if result['accuracy'] >= best_accuracy - accuracy_tolerance]
+    return max(candidates, key=lambda result: (result['texts_per_second'], result['accuracy']))
+
+
+def run_sweep(train_data_path, variants, folds=5, workers=None, seed=0,
+              output_path='best_intent_model', results_path='sweep_results.json',
+              accuracy_tolerance=0.01, throughput_texts=2000):
+    """
+    Cross-validate variants in parallel and save the best one
+
+    Accuracy, size and training time come from the parallel k-fold runs.
+    Throughput is then measured sequentially on a fixed set of corpus texts.
+    The chosen variant is the fastest member of the Pareto front whose
+    accuracy is within accuracy_tolerance of the best. It is retrained on
+    the full corpus and written to output_path, replacing the previous model there.
+
+    Args:
+        train_data_path (str): Training data (.json, .jsonl or .prepared.jsonl)
+        variants (list): Sweep variants
+        folds (int): Number of cross-validation folds
+        workers (int): Worker processes (defaults to one per CPU)
+        seed (int): Seed for fold assignment and training
+        output_path (str): Where the chosen model is written
+        results_path (str): JSON file for the per-variant results
+        accuracy_tolerance (float): Accuracy that may be traded for throughput
+        throughput_texts (int): Texts classified when measuring throughput
+
+    Returns:
+        dict: Result of the chosen variant
+
+    Raises:
+        ValueError: If there are fewer than two folds or fewer rows than folds
+    """
+    if folds < 2:
+        raise ValueError("Cross-validation needs at least 2 folds")
+    corpus_path = ensure_prepared(train_data_path)
+    rows = list(iter_prepared(corpus_path))
+    if len(rows) < folds:
+        raise ValueError(f"{train_data_path} has {len(rows)} rows, fewer than {folds} folds")
+    random.Random(seed).shuffle(rows)
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            futures = [
+                pool.submit(evaluate_variant, variant, rows, folds, seed, work_dir)
+                for variant in variants
+            ]
+            results = [future.result() for future in futures]
+
+        texts = [row['text'] for row in rows]
+        texts = (texts * (throughput_texts // len(texts) + 1))[:throughput_texts]
+        for result in results:
+            result['texts_per_second'] = measure_throughput(result.pop('model_path'), texts)
+
+        front = pareto_front(results)
+        best = choose_variant(front, accuracy_tolerance)
+
+    # train_model() writes next to output_path and renames into place, so the
+    # previous model stays loadable until the new one replaces it. Training on
+    # the prepared corpus itself records it for update_model() to replay.
+    train_variant(best, corpus_path, output_path, seed)
+
+    with open(results_path, 'w', encoding='utf-8') as f:
+        json.dump({
+            'results': results,
+            'pareto_front': [result['name'] for result in front],
+            'best': best['name'],
+        }, f, indent=2)
+
+    for result in results:
+        marker = '*' if result is best else ('+' if result in front else ' ')
+        print(f"{marker} {result['name']}: accuracy {result['accuracy']:.3f}, "
+              f"{result['model_mb']:.1f} MB, train {result['train_seconds']:.1f}s, "
+              f"{result['texts_per_second']:.0f} texts/s")
+    print(f"Best variant '{best['name']}' saved to {output_path}")
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Sweep textcat configurations with k-fold cross-validation")
+    parser.add_argument('--train-data', default='train_data.json')
+    parser.add_argument('--variants', help="JSON file with a list of variants (defaults to a built-in set)")
+    parser.add_argument('--folds', type=int, default=5)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default='best_intent_model')
+    parser.add_argument('--results', default='sweep_results.json')
+    parser.add_argument('--accuracy-tolerance', type=float, default=0.01,
+                        help="Accuracy the chosen variant may give up for throughput")
+    args = parser.parse_args()
+
+    variants = DEFAULT_VARIANTS
+    if args.variants:
+        with open(args.variants, 'r', encoding='utf-8') as f:
+            variants = json.load(f)
+
+    run_sweep(
+        args.train_data,
+        variants,
+        folds=args.folds,
+        workers=args.workers,
+        seed=args.seed,
+        output_path=args.output,
+        results_path=args.results,
+        accuracy_tolerance=args.accuracy_tolerance
+    )
+
+if __name__ == "__main__":
+    main()
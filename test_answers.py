@@ -0,0 +1,94 @@
+import itertools
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from answers import AnswerStore, ConnectionPool
+
+_db_names = itertools.count()
+
+
+@pytest.fixture
+def store():
+    # A named shared in-memory DB is visible to every pooled connection
+    # for as long as one of them stays open
+    store = AnswerStore.for_sqlite(f"file:answers{next(_db_names)}?mode=memory&cache=shared")
+    store.create_schema()
+    store.set_answers({'fee_structure': 'It is 1L', 'hostel_facilities': 'Rooms for 500'})
+    yield store
+    store.close()
+
+
+def test_get_answers_batches_and_reports_missing(store):
+    answers = store.get_answers(['fee_structure', 'hostel_facilities', 'library'])
+    assert answers == {'fee_structure': 'It is 1L', 'hostel_facilities': 'Rooms for 500', 'library': None}
+
+
+def test_intent_labels_are_matched_exactly(store):
+    assert store.get_answer('fee_structure') == 'It is 1L'
+    assert store.get_answers(['fee structure', 'FEE_STRUCTURE']) == {'fee structure': None, 'FEE_STRUCTURE': None}
+
+
+def test_cache_serves_repeats_and_set_answers_invalidates(store):
+    store.get_answer('fee_structure')
+    store.get_answer('fee_structure')
+    assert store.cache.stats()['hits'] == 1
+
+    store.set_answers({'fee_structure': 'It is 2L'})
+    assert store.get_answer('fee_structure') == 'It is 2L'
+    # Invalidation drops the stale entry but keeps the hit/miss counters
+    assert store.cache.stats()['hits'] == 1
+    assert store.cache.stats()['misses'] == 2
+
+
+def test_answer_predictions_attaches_top_intent_answer(store):
+    predictions = [
+        {'text': 'fees?', 'categories': {'fee_structure': 0.9, 'hostel_facilities': 0.1}},
+        {'text': 'rooms?', 'categories': {'hostel_facilities': 0.8, 'fee_structure': 0.2}},
+    ]
+    store.answer_predictions(predictions)
+    assert [(p['intent'], p['answer']) for p in predictions] == [
+        ('fee_structure', 'It is 1L'),
+        ('hostel_facilities', 'Rooms for 500'),
+    ]
+
+
+def test_waiter_gets_capacity_freed_by_a_failed_query():
+    pool = ConnectionPool(lambda: sqlite3.connect(':memory:', check_same_thread=False), size=1, timeout=5.0)
+    acquired = threading.Event()
+    release = threading.Event()
+
+    def fail_with_connection():
+        with pytest.raises(RuntimeError):
+            with pool.connection():
+                acquired.set()
+                release.wait()
+                raise RuntimeError("query failed")
+
+    holder = threading.Thread(target=fail_with_connection)
+    holder.start()
+    acquired.wait()
+    threading.Timer(0.1, release.set).start()
+
+    start = time.monotonic()
+    with pool.connection() as conn:
+        assert conn.execute("SELECT 1").fetchone() == (1,)
+    assert time.monotonic() - start < 1.0
+    holder.join()
+    pool.close()
+
+
+def test_answer_read_before_a_write_is_not_cached(store):
+    original_fetch = store._fetch
+
+    def fetch_then_write(intents):
+        found = original_fetch(intents)
+        store.set_answers({'fee_structure': 'It is 2L'})
+        return found
+
+    store._fetch = fetch_then_write
+    assert store.get_answer('fee_structure') == 'It is 1L'
+    store._fetch = original_fetch
+    assert store.get_answer('fee_structure') == 'It is 2L'
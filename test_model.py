@@ -0,0 +1,50 @@
+import json
+import os
+import shutil
+
+import pytest
+
+pytest.importorskip("spacy")
+
+from data_pipeline import iter_prepared
+from model import IntentClassifier
+
+_TRAIN_DATA = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'train_data.json')
+
+
+def _accuracy(classifier, rows):
+    predictions = classifier.predict([row['text'] for row in rows])
+    correct = sum(
+        next(iter(prediction['categories'])) == max(row['cats'], key=row['cats'].get)
+        for row, prediction in zip(rows, predictions)
+    )
+    return correct / len(rows)
+
+
+@pytest.fixture(scope='module')
+def trained(tmp_path_factory):
+    work_dir = tmp_path_factory.mktemp('model')
+    train_path = str(work_dir / 'train_data.json')
+    shutil.copy(_TRAIN_DATA, train_path)
+    classifier = IntentClassifier(
+        model_path=str(work_dir / 'intent_model'),
+        best_model_path=str(work_dir / 'best_intent_model')
+    )
+    classifier.train_model(train_path, max_epochs=10, dev_split=0.0)
+    rows = list(iter_prepared(str(work_dir / 'train_data.prepared.jsonl')))
+    return classifier, rows, work_dir
+
+
+def test_adding_a_label_keeps_existing_labels(trained):
+    classifier, rows, work_dir = trained
+    before = _accuracy(classifier, rows)
+
+    new_path = str(work_dir / 'library.jsonl')
+    with open(new_path, 'w', encoding='utf-8') as f:
+        for text in ['where is the library', 'library timings please', 'is the library open on sunday']:
+            f.write(json.dumps({'text': text, 'cats': {'library': 1.0}}) + '\n')
+
+    classifier.update_model(new_path, epochs=1)
+
+    assert 'library' in classifier.nlp.get_pipe("textcat").labels
+    assert _accuracy(classifier, rows) >= before - 0.1
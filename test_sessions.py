@@ -0,0 +1,19 @@
+from sessions import SessionStore
+
+
+def test_restored_session_includes_buffered_turns(tmp_path):
+    store = SessionStore(max_turns=3, db_path=str(tmp_path / 'sessions.db'), flush_interval=60)
+    for i in range(100):
+        store.add_turn(f"user{i}", 'hello', 'greeting', {'greeting': 1.0})
+    # Creating sessions for new users must not write the buffer on the request path
+    assert len(store._pending) == 100
+
+    store.add_turn('user0', 'fees?', 'fee_structure', {'fee_structure': 0.9})
+    store.flush()
+    store.add_turn('user0', 'and hostel?', 'hostel_facilities', {'hostel_facilities': 0.8})
+    store.end('user0')
+
+    restored = store.get('user0')
+    assert [turn.text for turn in restored.turns] == ['hello', 'fees?', 'and hostel?']
+    assert restored.last_turn.categories == {'hostel_facilities': 0.8}
+    store.close()